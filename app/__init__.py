@@ -1,44 +1,99 @@
+import os
+import weakref
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_wtf.csrf import CSRFProtect
 from flask_login import LoginManager # Importamos LoginManager
-from config import Config
+from config import Config, engine_options
+from app.cache import FragmentCache
+from app.search import MovieSearch
+from app.genre_index import GenreIndex
+from app.identity import IdentityCache
+from app.instrumentation import SQLInstrumentation
+from app.replicas import RoutingSession, ReplicaRouter
+from app.passwords import PasswordHasher
 # REMOVIDA: from app.models import User # Esta línea se mueve dentro de load_user
 
 # Inicializa las extensiones de Flask, pero sin vincularlas a una aplicación todavía
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession}) # Sesión que enruta lecturas a réplicas
 bcrypt = Bcrypt()
 csrf = CSRFProtect()
 login_manager = LoginManager() # Inicialización de LoginManager
+fragment_cache = FragmentCache() # Caché de fragmentos HTML renderizados
+search_index = MovieSearch() # Búsqueda de texto completo sobre el catálogo
+genre_index = GenreIndex() # Índice precalculado género -> películas (facetas y filtros)
+identity_cache = IdentityCache() # Identidad de usuario cacheada para el user_loader
+sql_instrumentation = SQLInstrumentation() # Perfil SQL por petición (opcional)
+replica_router = ReplicaRouter() # Réplicas de lectura para peticiones GET (opcional)
+password_hasher = PasswordHasher() # Hashing de contraseñas en un pool acotado (usa bcrypt)
 login_manager.login_view = 'main.login' # Define la ruta de login para redirect si no está logueado
 login_manager.login_message_category = 'info' # Define la categoría de mensajes flash para login
 
 @login_manager.user_loader
 def load_user(user_id):
-    # ¡IMPORTANTE! Importamos User aquí, DENTRO de la función, para evitar la importación circular.
-    from app.models import User 
-    return User.query.get(int(user_id))
+    # Único user_loader de la app: sirve id, username y role desde la caché de identidad,
+    # así que la mayoría de las peticiones autenticadas no consultan la tabla users
+    return identity_cache.load(int(user_id))
 
 def create_app(config_class=Config):
     # Crea una instancia de la aplicación Flask
     app = Flask(__name__)
     # Carga la configuración desde tu clase Config
     app.config.from_object(config_class)
+    # Pool y timeouts desde el entorno (una clase de configuración puede fijar SQLALCHEMY_ENGINE_OPTIONS)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    # Cada réplica de lectura se registra como un bind 'replica_N' con sus propias opciones de pool
+    replica_urls = app.config.get('DATABASE_REPLICA_URLS') or []
+    if replica_urls:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for i, url in enumerate(replica_urls):
+            binds[f'replica_{i}'] = {'url': url, **engine_options(app.config, url)}
+        app.config['SQLALCHEMY_BINDS'] = binds
 
     # Vincula las extensiones a la instancia de la aplicación
     db.init_app(app)
     bcrypt.init_app(app)
+    password_hasher.init_app(app) # Después de bcrypt: usa su configuración
     csrf.init_app(app)
     login_manager.init_app(app) # Vincula LoginManager a la app
+    fragment_cache.init_app(app)
+    search_index.init_app(app)
+    genre_index.init_app(app)
+    identity_cache.init_app(app)
+    sql_instrumentation.init_app(app)
+    replica_router.init_app(app)
+
+    # Buffer opcional de calificaciones y rankings (se importan aquí porque dependen de db y de los modelos)
+    from app.ratings import rating_buffer
+    from app.leaderboards import leaderboards
+    rating_buffer.init_app(app)
+    leaderboards.init_app(app)
 
     # Importa y registra los Blueprints (módulos de rutas)
     # Lo hacemos aquí al final de la función para evitar importaciones circulares
     from app.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
+    from app.api import api as api_blueprint # API JSON de solo lectura
+    app.register_blueprint(api_blueprint)
 
-    # Con el contexto de la aplicación, crea todas las tablas de la base de datos si no existen
-    with app.app_context():
-        db.create_all()
+    # Registra los comandos CLI de mantenimiento (flask recalc-ratings, etc.)
+    from app.cli import register_commands
+    register_commands(app)
 
-    return app
\ No newline at end of file
+    # create_app no abre conexiones ni revisa el esquema (las tablas se crean con `flask init-db`),
+    # así que se puede llamar en el proceso maestro de gunicorn --preload. Los workers heredan
+    # el pool por fork: cada hijo lo descarta sin cerrar las conexiones del maestro y abre las suyas.
+    if hasattr(os, 'register_at_fork'):
+        app_ref = weakref.ref(app)
+        os.register_at_fork(after_in_child=lambda: dispose_engines(app_ref()))
+
+    return app
+
+def dispose_engines(app):
+    if app is None:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
\ No newline at end of file
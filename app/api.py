@@ -0,0 +1,130 @@
+import hashlib
+
+from flask import Blueprint, jsonify, request, current_app, abort
+
+from app import db, genre_index
+from app.models import User, Movie, Genre, Comment, movie_genre
+from app.pagination import keyset_page, decode_cursor, encode_cursor, valid_cursor
+from app.routes import HOME_SORT_OPTIONS, COMMENTS_ORDER, catalog_params, filter_by_genres
+
+# API JSON de solo lectura (catálogo, detalle, comentarios y géneros).
+# Las consultas seleccionan columnas (sin hidratar objetos del ORM) y cada respuesta lleva un ETag
+# fuerte derivado de Movie.version, que incrementan las rutas de escritura; si el cliente envía
+# If-None-Match con el mismo ETag se responde 304 sin cuerpo.
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+MOVIE_COLUMNS = (Movie.id, Movie.title, Movie.release_year, Movie.poster_url,
+                 Movie.rating_count, Movie.rating_sum, Movie.version)
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def not_modified(etag):
+    # True si el cliente ya tiene esta versión
+    return request.if_none_match.contains(etag)
+
+def conditional(etag, build):
+    # Responde 304 si el ETag coincide; si no, construye la respuesta con `build()`
+    if not_modified(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True # Los clientes y la CDN deben revalidar con el ETag
+    return response
+
+def average(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 1) if rating_count else None
+
+def genres_by_movie(movie_ids):
+    # {movie_id: [géneros]} para varias películas con una sola consulta de columnas
+    genres = {movie_id: [] for movie_id in movie_ids}
+    if movie_ids:
+        rows = db.session.query(movie_genre.c.movie_id, Genre.name) \
+            .join(Genre, Genre.id == movie_genre.c.genre_id) \
+            .filter(movie_genre.c.movie_id.in_(movie_ids)).order_by(Genre.name)
+        for movie_id, name in rows:
+            genres[movie_id].append(name)
+    return genres
+
+def cursor_arg(name, order):
+    # Cursor decodificado del parámetro `name`; uno inválido es un error (400): servir la primera
+    # página haría que el cliente que pagina la recibiera otra vez y entrara en un ciclo
+    token = request.args.get(name)
+    values = decode_cursor(token)
+    if token and not valid_cursor(order, values):
+        abort(400)
+    return values
+
+def movie_summary(row, genres):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'release_year': row.release_year,
+        'poster_url': row.poster_url,
+        'genres': genres,
+        'rating': {'average': average(row.rating_sum, row.rating_count), 'count': row.rating_count},
+    }
+
+@api.route('/movies')
+def movies():
+    sort, per_page, selected_genres, match = catalog_params()
+    query, _ = filter_by_genres(db.session.query(*MOVIE_COLUMNS), selected_genres, match)
+    order = HOME_SORT_OPTIONS[sort]
+    page = keyset_page(query, order, per_page, after=cursor_arg('after', order), before=cursor_arg('before', order))
+    # El ETag depende de los parámetros, de la versión de cada película de la página y de los
+    # cursores: una película nueva puede abrir una página siguiente sin cambiar los items
+    etag = make_etag(request.query_string.decode('utf-8'), page.next_cursor, page.prev_cursor,
+                     *((row.id, row.version) for row in page.items))
+
+    def build():
+        genres = genres_by_movie([row.id for row in page.items])
+        return {
+            'items': [movie_summary(row, genres[row.id]) for row in page.items],
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+        }
+    return conditional(etag, build)
+
+@api.route('/movies/<int:movie_id>')
+def movie(movie_id):
+    # Primero solo la versión (una consulta mínima) para poder responder 304 sin hacer nada más
+    version = db.session.query(Movie.version).filter(Movie.id == movie_id).scalar()
+    if version is None:
+        abort(404)
+
+    def build():
+        row = db.session.query(*MOVIE_COLUMNS, Movie.description, Movie.trailer_url).filter(Movie.id == movie_id).one()
+        data = movie_summary(row, genres_by_movie([movie_id])[movie_id])
+        data['description'] = row.description
+        data['trailer_url'] = row.trailer_url
+        data['comment_count'] = db.session.query(db.func.count(Comment.id)).filter(Comment.movie_id == movie_id).scalar()
+        return data
+    return conditional(make_etag('movie', movie_id, version), build)
+
+@api.route('/movies/<int:movie_id>/comments')
+def comments(movie_id):
+    version = db.session.query(Movie.version).filter(Movie.id == movie_id).scalar()
+    if version is None:
+        abort(404)
+    after = cursor_arg('after', COMMENTS_ORDER)
+
+    def build():
+        query = db.session.query(Comment.id, Comment.content, Comment.timestamp, User.username) \
+            .join(User, User.id == Comment.user_id).filter(Comment.movie_id == movie_id)
+        page = keyset_page(query, COMMENTS_ORDER, current_app.config['COMMENTS_PER_PAGE'], after=after)
+        return {
+            'items': [{'id': row.id, 'content': row.content, 'author': row.username,
+                       'timestamp': row.timestamp.isoformat()} for row in page.items],
+            'next_cursor': page.next_cursor,
+        }
+    return conditional(make_etag('comments', movie_id, version, encode_cursor(after) if after else ''), build)
+
+@api.route('/genres')
+def genres():
+    # Conteos por género desde el índice precalculado; el ETag cambia cuando cambian los conteos
+    facets = genre_index.facet_counts()
+    return conditional(make_etag('genres', *facets),
+                       lambda: {'items': [{'name': name, 'count': count} for name, count in facets]})
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Caché de fragmentos HTML renderizados (tarjetas del catálogo, cabecera del detalle, páginas de comentarios).
+# Solo guarda markup que no depende del usuario: formularios y saludos se renderizan en cada petición.
+
+class CacheStats:
+    # Contadores de aciertos, fallos y desalojos para dimensionar la caché
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+class NullCache:
+    # Backend que no guarda nada (útil para desactivar la caché en desarrollo)
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key, record_stats=True):
+        if record_stats:
+            self.stats.misses += 1
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def __len__(self):
+        return 0
+
+class LRUCache:
+    # Backend en memoria del proceso: LRU acotado por número de entradas y con expiración (TTL)
+    def __init__(self, max_entries=2048, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, record_stats=True):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                if record_stats:
+                    self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            if record_stats:
+                self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+class FileSystemCache:
+    # Backend en disco compartido entre procesos (varios workers de gunicorn en la misma máquina).
+    # Recorrer el directorio cuesta O(entradas), así que no se hace en cada set(): cada proceso poda
+    # cada max_entries/10 escrituras y deja el directorio en el 90 % del máximo. Entre podas el
+    # directorio puede pasarse del máximo en, a lo sumo, ese número de escrituras por proceso.
+    # Cada acierto actualiza la fecha de modificación del archivo, así que la poda desaloja las
+    # entradas usadas hace más tiempo (LRU aproximado) y no las generaciones, que se leen siempre.
+    def __init__(self, cache_dir, max_entries=10000, default_timeout=300):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self.prune_every = max(1, max_entries // 10)
+        self._writes = 0 # Escrituras de este proceso desde la última poda
+        self.stats = CacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key, record_stats=True):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            expires, value = None, None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            value = None
+        elif value is not None:
+            try:
+                os.utime(path) # Marca el uso para la poda
+            except OSError:
+                pass
+        if record_stats:
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+        return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else None
+        # Escribe en un archivo temporal y lo renombra para que los lectores nunca vean un archivo a medias
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self._writes += 1
+        if self._writes >= self.prune_every:
+            self._prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _prune(self):
+        # Si hay demasiadas entradas, elimina las usadas hace más tiempo hasta el 90 % del máximo
+        self._writes = 0
+        entries = [e for e in os.scandir(self.cache_dir) if not e.name.startswith('.tmp')]
+        if len(entries) <= self.max_entries:
+            return
+        excess = len(entries) - self.max_entries * 9 // 10
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+                self.stats.evictions += 1
+            except OSError:
+                pass
+
+    def __len__(self):
+        return sum(1 for e in os.scandir(self.cache_dir) if not e.name.startswith('.tmp'))
+
+class FragmentCache:
+    # Extensión con la misma forma que las demás (se crea vacía y se vincula con init_app).
+    # Las claves de cada película incluyen una "generación": invalidar una película solo
+    # cambia su generación, y todos sus fragmentos anteriores quedan inalcanzables y expiran solos.
+    # Con réplicas de lectura la clave también lleva Movie.version leída en la misma petición (del
+    # mismo bind que renderiza): un fragmento renderizado desde una réplica atrasada queda guardado
+    # bajo la versión vieja, y en cuanto la réplica se pone al día la versión nueva lo renderiza otra vez.
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 2048)
+        if cache_type == 'lru':
+            self.backend = LRUCache(max_entries=max_entries, default_timeout=timeout)
+        elif cache_type == 'filesystem':
+            cache_dir = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'fragment_cache')
+            self.backend = FileSystemCache(cache_dir, max_entries=max_entries, default_timeout=timeout)
+        elif cache_type == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'CACHE_TYPE desconocido: {cache_type}')
+
+    def _generation(self, movie_id):
+        key = f'movie:{movie_id}:gen'
+        # Las lecturas de generación no cuentan en las estadísticas, solo las de fragmentos
+        generation = self.backend.get(key, record_stats=False)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            self.backend.set(key, generation, timeout=0)
+        return generation
+
+    def _key(self, movie_id, name, version=None):
+        key = f'movie:{movie_id}:{self._generation(movie_id)}:{name}'
+        return key if version is None else f'{key}:v{version}'
+
+    def get(self, movie_id, name, version=None):
+        return self.backend.get(self._key(movie_id, name, version))
+
+    def set(self, movie_id, name, value, timeout=None, version=None):
+        self.backend.set(self._key(movie_id, name, version), value, timeout)
+
+    def get_or_render(self, movie_id, name, render, version=None):
+        # Retorna el fragmento cacheado o lo renderiza con `render()` y lo guarda
+        value = self.get(movie_id, name, version)
+        if value is None:
+            value = render()
+            self.set(movie_id, name, value, version=version)
+        return value
+
+    def invalidate_movie(self, movie_id):
+        # Llamado desde las rutas de escritura después del commit
+        self.backend.set(f'movie:{movie_id}:gen', uuid.uuid4().hex, timeout=0)
+
+    def stats(self):
+        data = self.backend.stats.as_dict()
+        data['backend'] = type(self.backend).__name__
+        data['entries'] = len(self.backend)
+        return data
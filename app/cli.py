@@ -0,0 +1,184 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.schema import CreateColumn
+
+from app import db, search_index
+from app.models import Movie
+
+# Comandos de mantenimiento disponibles con `flask <comando>`
+
+@click.command('recalc-ratings')
+@with_appcontext
+def recalc_ratings_command():
+    # Reconstruye rating_count y rating_sum desde la tabla ratings (backfill/reparación) y los rankings
+    # que dependen de ellos (bayesian_score y la media global), que si no quedarían desfasados
+    from app.leaderboards import leaderboards
+    updated = Movie.recalculate_rating_aggregates()
+    click.echo(f'Agregados recalculados para {updated} películas con calificaciones.')
+    result = leaderboards.reconcile()
+    click.echo(f"Rankings recalculados: media global {result['global_mean']:.2f}.")
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    # Reconstruye el índice de búsqueda (REINDEX del GIN en PostgreSQL, 'rebuild' de la tabla FTS5
+    # en SQLite, compartidos por todos los workers; con el backend en memoria, solo el de este proceso)
+    indexed = search_index.rebuild()
+    click.echo(f'Índice de búsqueda reconstruido: {indexed} películas.')
+
+def create_missing_indexes():
+    # Crea los índices definidos en los modelos que falten en tablas ya existentes
+    # (db.create_all() no agrega índices a tablas que ya fueron creadas); retorna [(tabla, índice)]
+    def existing_indexes():
+        inspector = db.inspect(db.engine)
+        return {(table.name, index['name']) for table in db.metadata.sorted_tables
+                if inspector.has_table(table.name) for index in inspector.get_indexes(table.name)}
+
+    before = existing_indexes()
+    for table in db.metadata.sorted_tables:
+        if not db.inspect(db.engine).has_table(table.name):
+            continue
+        for index in table.indexes:
+            if (table.name, index.name) not in before:
+                index.create(db.engine) # Los índices con ddl_if (p. ej. solo PostgreSQL) se omiten solos
+    return sorted(existing_indexes() - before)
+
+def add_missing_columns():
+    # Agrega con ALTER TABLE ... ADD COLUMN las columnas de los modelos que falten en tablas ya
+    # existentes (db.create_all() no altera tablas); retorna [(tabla, columna)]
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise click.ClickException(f'{table.name}.{column.name} es NOT NULL sin server_default: '
+                                           'no se puede agregar a una tabla con filas.')
+            ddl = CreateColumn(column).compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}')
+            added.append((table.name, column.name))
+    return added
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    # Crea las tablas, columnas e índices que falten y completa los datos derivados de las columnas
+    # nuevas. Se ejecuta una vez por despliegue, no al arrancar cada worker (create_app no toca el esquema)
+    from app.leaderboards import leaderboards
+    tables = set(db.inspect(db.engine).get_table_names())
+    db.create_all()
+    # Solo las tablas de los modelos (en SQLite la tabla FTS5 de búsqueda agrega tablas internas)
+    created_tables = sorted((set(db.inspect(db.engine).get_table_names()) - tables) & set(db.metadata.tables))
+    added_columns = add_missing_columns()
+    created = create_missing_indexes()
+    for table_name in created_tables:
+        click.echo(f'Tabla {table_name} creada.')
+    for table_name, column_name in added_columns:
+        click.echo(f'Columna {column_name} agregada a {table_name}.')
+    for table_name, index_name in created:
+        click.echo(f'Índice {index_name} creado en {table_name}.')
+    if search_index.ensure_schema():
+        click.echo('Índice de búsqueda creado y poblado.')
+
+    # Backfill: las columnas nuevas de agregados y rankings nacen en 0/NULL
+    added_movie_columns = {column for table_name, column in added_columns if table_name == 'movies'}
+    if added_movie_columns & {'rating_count', 'rating_sum'}:
+        updated = Movie.recalculate_rating_aggregates()
+        click.echo(f'Agregados calculados para {updated} películas con calificaciones.')
+    if added_movie_columns & {'rating_count', 'rating_sum', 'bayesian_score', 'trending_score'}:
+        leaderboards.reconcile()
+        click.echo('Rankings calculados.')
+    click.echo(f'Esquema al día: {len(created_tables)} tablas, {len(added_columns)} columnas '
+               f'y {len(created)} índices creados.')
+
+@click.command('create-indexes')
+@with_appcontext
+def create_indexes_command():
+    # Solo los índices (útil después de agregar uno nuevo a un modelo)
+    created = create_missing_indexes()
+    for table_name, index_name in created:
+        click.echo(f'Índice {index_name} creado en {table_name}.')
+    click.echo(f'{len(created)} índices creados.')
+
+@click.command('import-movies')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Formato del archivo (por defecto se deduce de la extensión).')
+@click.option('--batch-size', type=int, default=None, help='Filas por lote (por defecto IMPORT_BATCH_SIZE).')
+@click.option('--reject-file', type=click.Path(dir_okay=False), default=None,
+              help='Archivo JSONL para las filas rechazadas (por defecto <archivo>.rejects.jsonl).')
+@with_appcontext
+def import_movies_command(path, fmt, batch_size, reject_file):
+    # Importa películas en lotes desde CSV/JSONL; se puede volver a ejecutar sin duplicar películas
+    from flask import current_app
+    from app.importer import import_movies
+
+    def progress(stats):
+        click.echo(f"{stats['read']} filas leídas, {stats['inserted']} insertadas "
+                   f"({stats['rows_per_second']:.0f} filas/s)")
+
+    stats = import_movies(path, fmt=fmt, batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+                          reject_path=reject_file, progress=progress)
+    click.echo(f"Importación terminada: {stats['inserted']} insertadas, {stats['skipped']} ya existentes, "
+               f"{stats['rejected']} rechazadas en {stats['seconds']:.1f} s ({stats['rows_per_second']:.0f} filas/s).")
+    if stats['reject_path']:
+        click.echo(f"Filas rechazadas en {stats['reject_path']}")
+
+@click.command('build-recommendations')
+@click.option('--incremental', is_flag=True, help='Solo actualiza las listas afectadas por calificaciones nuevas.')
+@with_appcontext
+def build_recommendations_command(incremental):
+    # Precalcula las K películas más similares de cada título (tabla similar_movies)
+    import time
+    from flask import current_app
+    from app import recommendations
+
+    started = time.perf_counter()
+    build = recommendations.refresh if incremental else recommendations.rebuild
+    updated = build(k=current_app.config['RECOMMENDATIONS_TOP_K'])
+    click.echo(f'Similitudes actualizadas para {updated} películas en {time.perf_counter() - started:.1f} s.')
+
+@click.command('reconcile-leaderboards')
+@with_appcontext
+def reconcile_leaderboards_command():
+    # Reconciliación periódica de los rankings (programar, p. ej., cada hora con cron)
+    from app.leaderboards import leaderboards
+    result = leaderboards.reconcile()
+    click.echo(f"Rankings reconciliados: media global {result['global_mean']:.2f}, "
+               f"{result['trending_movies']} películas con actividad reciente.")
+
+@click.command('seed-data')
+@click.option('--users', type=click.IntRange(min=0), default=1000, show_default=True)
+@click.option('--movies', type=click.IntRange(min=0), default=2000, show_default=True)
+@click.option('--genres', type=click.IntRange(min=0), default=12, show_default=True)
+@click.option('--ratings', type=click.IntRange(min=0), default=50000, show_default=True)
+@click.option('--comments', type=click.IntRange(min=0), default=5000, show_default=True)
+@click.option('--seed', type=int, default=42, show_default=True, help='Semilla para generar datos reproducibles.')
+@with_appcontext
+def seed_data_command(users, movies, genres, ratings, comments, seed):
+    # Llena la base configurada con datos sintéticos (popularidad Zipf) para desarrollo y benchmarks
+    from flask import current_app
+    from app.seed import seed_database, SEED_PASSWORD
+    result = seed_database(users=users, movies=movies, genres=genres, ratings=ratings, comments=comments,
+                           seed=seed, batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                           progress=lambda step: click.echo(f'  {step} listo'))
+    click.echo(f"Datos generados en {result['seconds']:.1f} s: {result['users']} usuarios, {result['movies']} películas, "
+               f"{result['genres']} géneros, {result['ratings']} calificaciones y {result['comments']} comentarios.")
+    click.echo(f'Contraseña de los usuarios generados: {SEED_PASSWORD}')
+
+def register_commands(app):
+    # Registra todos los comandos CLI en la aplicación
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(recalc_ratings_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(create_indexes_command)
+    app.cli.add_command(import_movies_command)
+    app.cli.add_command(build_recommendations_command)
+    app.cli.add_command(reconcile_leaderboards_command)
+    app.cli.add_command(seed_data_command)
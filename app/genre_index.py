@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import defaultdict
+
+# Índice precalculado género -> películas, guardado como bitsets (un int de Python por género,
+# donde el bit N encendido significa que la película con id N tiene ese género).
+# Las intersecciones/uniones para filtrar y los conteos por faceta son operaciones de bits,
+# así que ninguna página necesita un GROUP BY sobre todo el catálogo.
+
+# Las actualizaciones releen también los últimos REFRESH_OVERLAP ids ya vistos: en PostgreSQL un id
+# menor puede hacerse visible después que uno mayor si su transacción terminó más tarde
+REFRESH_OVERLAP = 1000
+
+def iter_ids(bits):
+    # Recorre los ids (bits encendidos) de menor a mayor
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+def to_bits(ids):
+    # Bitset con los ids dados, en tiempo lineal: cada `bits |= 1 << id` copia el entero completo,
+    # así que armarlo id por id es cuadrático en el tamaño del catálogo
+    if not ids:
+        return 0
+    buffer = bytearray((max(ids) >> 3) + 1)
+    for movie_id in ids:
+        buffer[movie_id >> 3] |= 1 << (movie_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+class GenreIndex:
+    # Extensión con la misma forma que las demás (se crea vacía y se vincula con init_app).
+    # Se construye de forma perezosa y, cada GENRE_INDEX_MAX_AGE segundos, incorpora las películas
+    # añadidas en otros procesos. Las películas no se borran ni cambian de géneros, así que basta
+    # con leer las filas de movie_genre con id mayor al último indexado; la reconstrucción completa
+    # queda para la primera lectura y para los comandos (seed-data).
+    def __init__(self, app=None):
+        self.max_age = 30
+        self._bits = {}
+        self._max_movie_id = 0
+        self._built_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_age = app.config.get('GENRE_INDEX_MAX_AGE', 30)
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            self.rebuild()
+        elif self.max_age and time.monotonic() - self._built_at > self.max_age:
+            self.refresh()
+        return self._bits
+
+    def rebuild(self):
+        from app import db
+        from app.models import Genre, movie_genre
+        ids = {name: [] for (name,) in db.session.query(Genre.name)}
+        rows = db.session.query(Genre.name, movie_genre.c.movie_id) \
+            .join(movie_genre, movie_genre.c.genre_id == Genre.id).yield_per(5000)
+        for name, movie_id in rows:
+            ids[name].append(movie_id)
+        bits = {name: to_bits(movie_ids) for name, movie_ids in ids.items()}
+        with self._lock:
+            self._bits = bits
+            self._max_movie_id = max((max(movie_ids) for movie_ids in ids.values() if movie_ids), default=0)
+            self._built_at = time.monotonic()
+        return len(bits)
+
+    def refresh(self):
+        # Incorpora las películas nuevas con una consulta por rango sobre la clave primaria de
+        # movie_genre; retorna la cantidad de filas leídas
+        from app import db
+        from app.models import Genre, movie_genre
+        since = max(self._max_movie_id - REFRESH_OVERLAP, 0)
+        rows = db.session.query(Genre.name, movie_genre.c.movie_id) \
+            .join(movie_genre, movie_genre.c.genre_id == Genre.id).filter(movie_genre.c.movie_id > since).all()
+        ids = defaultdict(list)
+        for name, movie_id in rows:
+            ids[name].append(movie_id)
+        with self._lock:
+            bits = dict(self._bits)
+            for name, movie_ids in ids.items():
+                bits[name] = bits.get(name, 0) | to_bits(movie_ids)
+            self._bits = bits
+            self._max_movie_id = max([self._max_movie_id] + [movie_id for _, movie_id in rows])
+            self._built_at = time.monotonic()
+        return len(rows)
+
+    def add_movie(self, movie_id, genre_names):
+        # Actualización incremental llamada por add_movie después del commit. No avanza
+        # _max_movie_id: las películas con ids menores de otros procesos todavía no se leyeron
+        if self._built_at is None:
+            return # Se construirá completo en la primera lectura
+        with self._lock:
+            bits = dict(self._bits)
+            for name in genre_names:
+                bits[name] = bits.get(name, 0) | (1 << movie_id)
+            self._bits = bits
+
+    def genres(self):
+        return sorted(self._ensure_built())
+
+    def match(self, names, match_all=True):
+        # Bitset de las películas que tienen todos (AND) o alguno (OR) de los géneros pedidos
+        bits = self._ensure_built()
+        sets = [bits.get(name, 0) for name in names]
+        if not sets:
+            return 0
+        result = sets[0]
+        for genre_bits in sets[1:]:
+            result = (result & genre_bits) if match_all else (result | genre_bits)
+        return result
+
+    def facet_counts(self, within=None):
+        # [(género, cantidad)] de películas por género, opcionalmente dentro de un filtro ya aplicado
+        bits = self._ensure_built()
+        if within is None:
+            counts = [(name, genre_bits.bit_count()) for name, genre_bits in bits.items()]
+        else:
+            counts = [(name, (genre_bits & within).bit_count()) for name, genre_bits in bits.items()]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+    @staticmethod
+    def count(bits):
+        return bits.bit_count()
+
+    @staticmethod
+    def ids(bits):
+        return list(iter_ids(bits))
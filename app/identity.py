@@ -0,0 +1,83 @@
+import time
+
+from flask import session
+from flask_login import UserMixin
+
+from app.cache import LRUCache
+
+# Identidad cacheada para el user_loader de Flask-Login: la mayoría de las peticiones autenticadas
+# solo necesitan id, username y role, así que se sirven desde un LRU acotado con TTL (y opcionalmente
+# desde un claim en la cookie de sesión, que Flask ya firma) sin consultar la tabla users.
+# La caché es por proceso, así que un cambio de rol solo invalida la del worker que lo hizo: por eso
+# moderator_required no confía en el rol cacheado y lo relee de la base de datos.
+
+SESSION_CLAIM_KEY = '_identity'
+
+class CachedUser(UserMixin):
+    # Sustituto liviano del modelo User para current_user (solo lectura)
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+class IdentityCache:
+    # Extensión con la misma forma que las demás (se crea vacía y se vincula con init_app)
+    def __init__(self, app=None):
+        self.cache = LRUCache()
+        self.session_claims = False
+        self.claim_max_age = 300
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.cache = LRUCache(max_entries=app.config.get('IDENTITY_CACHE_SIZE', 10000),
+                              default_timeout=app.config.get('IDENTITY_CACHE_TTL', 300))
+        self.session_claims = app.config.get('IDENTITY_SESSION_CLAIMS', False)
+        self.claim_max_age = app.config.get('IDENTITY_CLAIM_MAX_AGE', 300)
+
+    def load(self, user_id):
+        # 1) caché del proceso, 2) claim firmado en la sesión, 3) una consulta a la base de datos
+        identity = self.cache.get(user_id)
+        if identity is None and self.session_claims:
+            identity = self._from_session(user_id)
+            if identity is not None:
+                self.cache.set(user_id, identity)
+        if identity is None:
+            from app.models import User
+            user = User.query.with_entities(User.id, User.username, User.role).filter(User.id == user_id).first()
+            if user is None:
+                return None
+            identity = tuple(user)
+            self.cache.set(user_id, identity)
+        return CachedUser(*identity)
+
+    def _from_session(self, user_id):
+        claim = session.get(SESSION_CLAIM_KEY)
+        if not claim or claim[0] != user_id or time.time() - claim[3] > self.claim_max_age:
+            return None
+        return tuple(claim[:3])
+
+    def remember(self, user):
+        # Llamado al iniciar sesión: deja la identidad lista para las siguientes peticiones
+        identity = (user.id, user.username, user.role)
+        self.cache.set(user.id, identity)
+        if self.session_claims:
+            session[SESSION_CLAIM_KEY] = [*identity, time.time()]
+
+    def forget(self):
+        # Llamado al cerrar sesión
+        session.pop(SESSION_CLAIM_KEY, None)
+
+    def invalidate(self, user_id):
+        # Llamado cuando cambian el rol o las credenciales de un usuario (solo en este proceso). Los
+        # claims de sesión ya emitidos no se pueden revocar desde aquí y expiran tras IDENTITY_CLAIM_MAX_AGE
+        # segundos; los permisos igual se verifican contra la base de datos en moderator_required.
+        self.cache.delete(user_id)
+
+    def stats(self):
+        data = self.cache.stats.as_dict()
+        data['entries'] = len(self.cache)
+        return data
@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+import time
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import Movie, Genre, movie_genre
+
+# Importación masiva del catálogo en streaming: lectura -> validación -> lotes -> inserción.
+# Cada etapa es un generador, así que la memoria depende del tamaño del lote y no del archivo.
+
+class RowError(ValueError):
+    # Fila inválida: se escribe en el archivo de rechazos y la importación continúa
+    def __init__(self, message, raw=None):
+        super().__init__(message)
+        self.raw = raw
+
+def _decodes(text):
+    # False si el texto trae bytes que no son UTF-8 (leídos con surrogateescape)
+    try:
+        text.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def _escape_bytes(text):
+    # Representación legible de los bytes inválidos para el archivo de rechazos (p. ej. \xe9)
+    return text.encode('utf-8', 'surrogateescape').decode('utf-8', 'backslashreplace')
+
+def read_rows(path, fmt=None):
+    # Genera (número de línea, dict) desde un archivo CSV (con encabezados) o JSONL. Los bytes que no
+    # son UTF-8 no detienen la importación: su fila se envía a los rechazos y se sigue con la siguiente.
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8', errors='surrogateescape') as f:
+        if fmt == 'csv':
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                if not all(_decodes(value) for value in row.values() if isinstance(value, str)):
+                    row = RowError('La fila contiene bytes que no son UTF-8 válido.', raw={
+                        key: _escape_bytes(value) if isinstance(value, str) else value for key, value in row.items()})
+                yield line_no, row
+        elif fmt == 'jsonl':
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                if not _decodes(line):
+                    yield line_no, RowError('La línea contiene bytes que no son UTF-8 válido.', raw=_escape_bytes(line.rstrip('\n')))
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = RowError(f'JSON inválido: {e}', raw=line.rstrip('\n'))
+                yield line_no, row
+        else:
+            raise ValueError(f'Formato desconocido: {fmt}')
+
+def _text(row, field, max_length=None, required=True):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise RowError(f'Falta el campo {field}.')
+    if max_length and len(value) > max_length:
+        raise RowError(f'El campo {field} supera {max_length} caracteres.')
+    return value or None
+
+def clean_row(row):
+    # Valida una fila con las mismas reglas que MovieForm y la normaliza
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError('La fila no es un objeto.')
+    try:
+        release_year = int(str(row.get('release_year', '')).strip())
+    except ValueError:
+        raise RowError('release_year debe ser un número entero.')
+    if release_year < 1888:
+        raise RowError('Año inválido.')
+    genres = row.get('genres') or ''
+    if isinstance(genres, str):
+        genres = genres.split(',')
+    genres = list(dict.fromkeys(str(g).strip() for g in genres if str(g).strip()))
+    if not genres:
+        raise RowError('Falta el campo genres.')
+    if any(len(g) > 50 for g in genres):
+        raise RowError('Un género supera 50 caracteres.')
+    return {
+        'title': _text(row, 'title', 100),
+        'description': _text(row, 'description'),
+        'release_year': release_year,
+        'poster_url': _text(row, 'poster_url', 255),
+        'trailer_url': _text(row, 'trailer_url', 255, required=False),
+        'genres': genres,
+    }
+
+def clean_rows(rows, rejects):
+    # Filtra las filas inválidas hacia `rejects(line_no, row, error)` y deja pasar las válidas
+    for line_no, row in rows:
+        try:
+            yield line_no, clean_row(row)
+        except RowError as e:
+            rejects(line_no, row, str(e))
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def import_batch(batch):
+    # Inserta un lote: una búsqueda/upsert de géneros, una búsqueda de duplicados y dos INSERT masivos.
+    # Es idempotente: las películas ya existentes (mismo título y año) se omiten.
+    titles = {row['title'] for _, row in batch}
+    existing = set(db.session.query(Movie.title, Movie.release_year).filter(Movie.title.in_(titles)))
+    new_rows = []
+    for _, row in batch:
+        key = (row['title'], row['release_year'])
+        if key not in existing:
+            existing.add(key) # También evita duplicados dentro del mismo lote
+            new_rows.append(row)
+    if not new_rows:
+        return 0
+
+    genre_ids = Genre.resolve_ids(name for row in new_rows for name in row['genres'])
+    movie_columns = ('title', 'description', 'release_year', 'poster_url', 'trailer_url')
+    inserted = db.session.execute(
+        db.insert(Movie.__table__).returning(Movie.id, sort_by_parameter_order=True),
+        [{column: row[column] for column in movie_columns} for row in new_rows]
+    ).scalars().all()
+    db.session.execute(movie_genre.insert(), [
+        {'movie_id': movie_id, 'genre_id': genre_ids[name]}
+        for movie_id, row in zip(inserted, new_rows) for name in row['genres']
+    ])
+    db.session.commit()
+    return len(new_rows)
+
+def import_movies(path, fmt=None, batch_size=500, reject_path=None, progress=None):
+    # Importa el archivo completo y retorna las estadísticas; `progress(stats)` se llama por lote
+    reject_path = reject_path or os.path.splitext(path)[0] + '.rejects.jsonl'
+    stats = {'read': 0, 'inserted': 0, 'skipped': 0, 'rejected': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    started = time.perf_counter()
+    reject_file = None
+
+    def rejects(line_no, row, error):
+        nonlocal reject_file
+        if reject_file is None:
+            reject_file = open(reject_path, 'w', encoding='utf-8')
+        raw = row.raw if isinstance(row, RowError) else row
+        reject_file.write(json.dumps({'line': line_no, 'error': error, 'row': raw}, ensure_ascii=False, default=str) + '\n')
+        stats['rejected'] += 1
+
+    def counted(rows):
+        for item in rows:
+            stats['read'] += 1
+            yield item
+
+    try:
+        for batch in batched(clean_rows(counted(read_rows(path, fmt)), rejects), batch_size):
+            try:
+                inserted = import_batch(batch)
+            except SQLAlchemyError:
+                # Si el lote falla en la base de datos, se reintenta fila por fila para aislar las culpables
+                db.session.rollback()
+                inserted = 0
+                for item in batch:
+                    try:
+                        inserted += import_batch([item])
+                    except SQLAlchemyError as e:
+                        db.session.rollback()
+                        rejects(item[0], item[1], f'Error de base de datos: {e.__class__.__name__}')
+            stats['inserted'] += inserted
+            stats['skipped'] = stats['read'] - stats['inserted'] - stats['rejected']
+            stats['seconds'] = time.perf_counter() - started
+            stats['rows_per_second'] = stats['read'] / stats['seconds'] if stats['seconds'] else 0.0
+            if progress:
+                progress(stats)
+    finally:
+        if reject_file is not None:
+            reject_file.close()
+    stats['skipped'] = stats['read'] - stats['inserted'] - stats['rejected']
+    stats['seconds'] = time.perf_counter() - started
+    stats['rows_per_second'] = stats['read'] / stats['seconds'] if stats['seconds'] else 0.0
+    stats['reject_path'] = reject_path if stats['rejected'] else None
+    return stats
@@ -0,0 +1,177 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Instrumentación SQL por petición (opcional, SQL_INSTRUMENTATION=true).
+# Escucha los eventos de los engines de SQLAlchemy y, para cada petición, acumula el número de
+# consultas, el tiempo en la base de datos y las "formas" de las sentencias (el SQL sin valores).
+# Una misma forma ejecutada muchas veces con parámetros distintos delata un patrón N+1.
+
+_IN_LIST = re.compile(r'\bIN\s*\([^()]*\)', re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_SPACES = re.compile(r'\s+')
+
+def statement_shape(statement):
+    # Normaliza una sentencia: listas IN, literales y espacios no distinguen formas
+    shape = _IN_LIST.sub('IN (...)', statement)
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+class RequestProfile:
+    # Consultas de una petición agrupadas por forma: {forma: [ejecuciones, segundos, {parámetros}]}
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = {}
+
+    def record(self, statement, parameters, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        entry = self.shapes.setdefault(statement_shape(statement), [0, 0.0, set()])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2].add(repr(parameters)[:200])
+
+    def suspects(self, threshold):
+        # Formas ejecutadas más de `threshold` veces con parámetros distintos (probable N+1)
+        return [shape for shape, (count, _, params) in self.shapes.items()
+                if count > threshold and len(params) > 1]
+
+    def top_statements(self, limit):
+        ranked = sorted(self.shapes.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'statement': shape[:500], 'count': count, 'distinct_params': len(params),
+                 'db_ms': round(seconds * 1000, 2)} for shape, (count, seconds, params) in ranked]
+
+class RouteStats:
+    # Acumulados por ruta para el endpoint de depuración
+    def __init__(self, window):
+        self.requests = 0
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.n_plus_one = 0
+        self.slow = 0
+        self.recent = deque(maxlen=window) # Duraciones recientes para los percentiles
+
+    def as_dict(self):
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2) if recent else None
+
+        return {
+            'requests': self.requests,
+            'mean_ms': round(self.total_ms / self.requests, 2),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'mean_db_ms': round(self.db_ms / self.requests, 2),
+            'mean_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'n_plus_one_requests': self.n_plus_one,
+            'slow_requests': self.slow,
+        }
+
+class SQLInstrumentation:
+    def __init__(self, app=None):
+        self.enabled = False
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SQL_INSTRUMENTATION', False)
+        if not self.enabled:
+            return
+        self.threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 5)
+        self.slow_ms = app.config.get('SQL_SLOW_REQUEST_MS', 500)
+        self.log_statements = app.config.get('SQL_SLOW_LOG_STATEMENTS', 5)
+        self.window = app.config.get('SQL_STATS_WINDOW', 500)
+        if not self._listening:
+            # Se escucha la clase Engine para cubrir todos los engines (incluidas réplicas de lectura)
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+            self._listening = True
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _profile(self):
+        return g.get('sql_profile') if has_request_context() else None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._profile() is not None:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._profile()
+        if profile is not None and conn.info.get('query_started'):
+            seconds = time.perf_counter() - conn.info['query_started'].pop()
+            profile.record(statement, None if executemany else parameters, seconds)
+
+    def _start_request(self):
+        g.sql_profile = RequestProfile()
+
+    def _finish_request(self, response):
+        profile = g.pop('sql_profile', None)
+        if profile is None:
+            return response
+        total_ms = (time.perf_counter() - profile.started) * 1000
+        db_ms = profile.db_seconds * 1000
+        response.headers['Server-Timing'] = (f'db;dur={db_ms:.1f};desc="{profile.queries} queries", '
+                                             f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}')
+
+        suspects = profile.suspects(self.threshold)
+        slow = total_ms >= self.slow_ms
+        route = request.url_rule.rule if request.url_rule else '<sin ruta>'
+        with self._lock:
+            stats = self._routes.get((request.method, route))
+            if stats is None:
+                stats = self._routes[(request.method, route)] = RouteStats(self.window)
+            stats.requests += 1
+            stats.total_ms += total_ms
+            stats.db_ms += db_ms
+            stats.queries += profile.queries
+            stats.max_queries = max(stats.max_queries, profile.queries)
+            stats.n_plus_one += bool(suspects)
+            stats.slow += slow
+            stats.recent.append(total_ms)
+
+        if slow or suspects:
+            # Log estructurado (una línea JSON) con las sentencias que más tiempo consumieron
+            logger.warning('slow_request %s', json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'duration_ms': round(total_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'queries': profile.queries,
+                'slow': slow,
+                'n_plus_one': [shape[:500] for shape in suspects],
+                'top_statements': profile.top_statements(self.log_statements),
+            }, ensure_ascii=False))
+        return response
+
+    def stats(self):
+        # Estadísticas por ruta ordenadas por tiempo total acumulado
+        with self._lock:
+            items = sorted(self._routes.items(), key=lambda item: item[1].total_ms, reverse=True)
+            return [{'method': method, 'route': route, **stats.as_dict()} for (method, route), stats in items]
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
@@ -0,0 +1,152 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, case
+
+from app import db
+from app.models import Movie, Rating, LeaderboardState, dialect_insert
+
+# Rankings "mejor calificadas" y "tendencias" materializados en columnas indexadas de Movie.
+#
+# - bayesian_score = (C * m + suma) / (C + conteo): el promedio se acerca a la media global m
+#   mientras la película tiene pocas calificaciones (C = LEADERBOARD_PRIOR_WEIGHT).
+# - trending_score = suma de exp(lambda * (t - epoch)) sobre cada calificación escrita. Dividido por
+#   exp(lambda * (ahora - epoch)) es la actividad con decaimiento exponencial (vida media
+#   TRENDING_HALF_LIFE_HOURS); como ese divisor es el mismo para todas las películas, el orden no
+#   cambia y cada escritura solo tiene que sumar su peso.
+#
+# Las escrituras actualizan ambas columnas en el mismo UPDATE que los agregados de calificaciones.
+# La reconciliación periódica recalcula la media global, reescribe bayesian_score y reconstruye
+# trending_score con una nueva época para que los pesos no crezcan sin límite.
+
+logger = logging.getLogger(__name__)
+
+MAX_EXPONENT = 600 # exp(600) sigue siendo un float finito; más allá hay que reconciliar
+RECONCILE_BATCH = 20000 # Calificaciones leídas por consulta en la reconciliación
+
+class Leaderboards:
+    # Se crea vacía y se vincula con init_app (como las demás extensiones)
+    def __init__(self, app=None):
+        self.prior_weight = 10.0
+        self.half_life = timedelta(hours=24)
+        self.state_ttl = 60
+        self._state = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.prior_weight = float(app.config.get('LEADERBOARD_PRIOR_WEIGHT', 10))
+        self.half_life = timedelta(hours=app.config.get('TRENDING_HALF_LIFE_HOURS', 24))
+        self.state_ttl = app.config.get('LEADERBOARD_STATE_TTL', 60)
+        self._state = None
+
+    @property
+    def decay_rate(self):
+        return math.log(2) / self.half_life.total_seconds()
+
+    def _db_now(self):
+        return db.session.query(db.func.current_timestamp()).scalar().replace(tzinfo=None)
+
+    def state(self):
+        # (media global, época, diferencia entre el reloj de la base de datos y el del proceso).
+        # Se cachea en el proceso para no agregar una consulta a cada calificación.
+        state = self._state
+        if state is None or time.monotonic() - state[3] > self.state_ttl:
+            with self._lock:
+                row = db.session.get(LeaderboardState, 1)
+                db_now = self._db_now()
+                if row is None:
+                    # Primera vez: se crea la fila (sin fallar si otro worker la crea al mismo tiempo)
+                    db.session.execute(dialect_insert(LeaderboardState.__table__).on_conflict_do_nothing(),
+                                       {'id': 1, 'global_mean': self._global_mean(), 'epoch': db_now})
+                    row = db.session.get(LeaderboardState, 1)
+                offset = db_now - datetime.now(timezone.utc).replace(tzinfo=None)
+                state = (row.global_mean, row.epoch, offset, time.monotonic())
+                self._state = state
+        return state
+
+    def _global_mean(self):
+        # Sin calificaciones todavía, se usa el punto medio de la escala de 1 a 5
+        total_sum, total_count = db.session.query(db.func.sum(Movie.rating_sum), db.func.sum(Movie.rating_count)).one()
+        return float(total_sum) / float(total_count) if total_count else 3.0
+
+    def activity_weight(self):
+        # Peso de una calificación escrita ahora, relativo a la época vigente
+        _, epoch, offset, _ = self.state()
+        now = datetime.now(timezone.utc).replace(tzinfo=None) + offset
+        exponent = self.decay_rate * (now - epoch).total_seconds()
+        if exponent > MAX_EXPONENT:
+            logger.warning('trending_score cerca del desbordamiento: ejecuta `flask reconcile-leaderboards`')
+            exponent = MAX_EXPONENT
+        return math.exp(exponent)
+
+    def update_values(self, count_delta, sum_delta, activity):
+        # Valores extra para el UPDATE de agregados de Movie (las columnas del lado derecho son las
+        # de antes del UPDATE, así que se suman los deltas)
+        global_mean = self.state()[0]
+        movies = Movie.__table__
+        return {
+            'bayesian_score': (self.prior_weight * global_mean + movies.c.rating_sum + sum_delta)
+                              / (self.prior_weight + movies.c.rating_count + count_delta),
+            'trending_score': movies.c.trending_score + activity * self.activity_weight(),
+        }
+
+    def top_rated(self, limit):
+        return Movie.query.filter(Movie.bayesian_score.isnot(None)) \
+            .order_by(Movie.bayesian_score.desc(), Movie.id.desc()).limit(limit).all()
+
+    def trending(self, limit):
+        return Movie.query.filter(Movie.trending_score > 0) \
+            .order_by(Movie.trending_score.desc(), Movie.id.desc()).limit(limit).all()
+
+    def reconcile(self):
+        # Recalcula la media global y ambos puntajes desde cero con una época nueva. Primero se lee
+        # todo y después se escriben los UPDATE seguidos: el recorrido de las calificaciones no debe
+        # hacerse con las filas de movies (o la base SQLite) bloqueadas, porque cada calificación
+        # nueva espera ese bloqueo para actualizar los agregados. La lectura va por lotes de id:
+        # en SQLite cada consulta retiene un bloqueo compartido que también frena las escrituras,
+        # y entre un lote y el siguiente pueden pasar.
+        now = self._db_now()
+        global_mean = self._global_mean()
+
+        # Las calificaciones de más de 20 vidas medias aportan menos de una millonésima: se ignoran
+        horizon = now - 20 * self.half_life
+        trending = {}
+        last_id = 0
+        while True:
+            rows = db.session.query(Rating.id, Rating.movie_id, Rating.timestamp) \
+                .filter(Rating.id > last_id, Rating.timestamp >= horizon) \
+                .order_by(Rating.id).limit(RECONCILE_BATCH).all()
+            if not rows:
+                break
+            for _, movie_id, timestamp in rows:
+                age = (now - timestamp).total_seconds()
+                trending[movie_id] = trending.get(movie_id, 0.0) + math.exp(-self.decay_rate * max(age, 0.0))
+            last_id = rows[-1].id
+        db.session.commit() # Cierra la transacción de lectura antes de escribir
+
+        movies = Movie.__table__
+        db.session.execute(movies.update().values(
+            bayesian_score=case(
+                (movies.c.rating_count > 0,
+                 (self.prior_weight * global_mean + movies.c.rating_sum) / (self.prior_weight + movies.c.rating_count)),
+                else_=None),
+            trending_score=0))
+        if trending:
+            db.session.execute(
+                movies.update().where(movies.c.id == bindparam('b_movie_id')).values(trending_score=bindparam('b_score')),
+                [{'b_movie_id': movie_id, 'b_score': score} for movie_id, score in trending.items()])
+
+        row = db.session.get(LeaderboardState, 1) or LeaderboardState(id=1)
+        row.global_mean = global_mean
+        row.epoch = now
+        db.session.add(row)
+        db.session.commit()
+        self._state = None
+        return {'global_mean': global_mean, 'trending_movies': len(trending)}
+
+leaderboards = Leaderboards()
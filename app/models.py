@@ -1,12 +1,24 @@
 from app import db # Importa la instancia de SQLAlchemy desde tu __init__.py
 from flask_login import UserMixin
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy import func # Importa func para AVG
+from sqlalchemy import func, text, event, DDL # Importa func para agregados y text para expresiones SQL
+import sqlalchemy.dialects.postgresql # Registra las funciones de búsqueda de texto (to_tsvector, etc.)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+def dialect_insert(table):
+    # INSERT con soporte de ON CONFLICT según el motor en uso (PostgreSQL o SQLite)
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql_insert(table)
+    return sqlite_insert(table)
 
 # Tabla de asociación para la relación Many-to-Many entre Movie y Genre
 movie_genre = db.Table('movie_genre',
     db.Column('movie_id', db.Integer, db.ForeignKey('movies.id'), primary_key=True),
-    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True)
+    db.Column('genre_id', db.Integer, db.ForeignKey('genres.id'), primary_key=True),
+    # La clave primaria (movie_id, genre_id) cubre "géneros de una película";
+    # este índice cubre "películas de un género" para los filtros por género en SQL
+    db.Index('ix_movie_genre_genre_id_movie_id', 'genre_id', 'movie_id')
 )
 
 class User(UserMixin, db.Model):
@@ -25,6 +37,13 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Si cambian el rol o las credenciales de un usuario, su identidad cacheada deja de ser válida
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def invalidate_cached_identity(mapper, connection, target):
+    from app import identity_cache
+    identity_cache.invalidate(target.id)
+
 class Movie(db.Model):
     __tablename__ = 'movies' # Nombre de la tabla en la base de datos
     id = db.Column(db.Integer, primary_key=True)
@@ -34,6 +53,29 @@ class Movie(db.Model):
     poster_url = db.Column(db.String(255), nullable=False)
     trailer_url = db.Column(db.String(255), nullable=True) # URL del tráiler es opcional
 
+    # Agregados de calificaciones desnormalizados, mantenidos por rate_movie
+    # (se pueden reparar con el comando `flask recalc-ratings`)
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
+    # Puntajes materializados de los rankings, actualizados en cada calificación
+    # y reconciliados con `flask reconcile-leaderboards` (ver app/leaderboards.py)
+    bayesian_score = db.Column(db.Float, nullable=True) # Promedio bayesiano (NULL sin calificaciones)
+    trending_score = db.Column(db.Float, default=0, server_default='0', nullable=False) # Actividad con decaimiento temporal
+
+    # Versión de la película: la incrementan las rutas de escritura (calificaciones y comentarios)
+    # y la API JSON la usa para construir ETags
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
+    # Índices compuestos para la paginación por keyset del catálogo
+    __table_args__ = (
+        db.Index('ix_movies_release_year_id', 'release_year', 'id'),
+        db.Index('ix_movies_title_id', 'title', 'id'),
+        # Índices de los rankings: el top N es un recorrido de N entradas del índice
+        db.Index('ix_movies_bayesian_score_id', 'bayesian_score', 'id'),
+        db.Index('ix_movies_trending_score_id', 'trending_score', 'id'),
+    )
+
     # Relaciones: Una película puede tener muchas calificaciones y muchos comentarios
     ratings = db.relationship('Rating', backref='movie_obj', lazy=True)
     comments = db.relationship('Comment', backref='movie_obj', lazy=True)
@@ -47,13 +89,30 @@ class Movie(db.Model):
 
     @property
     def average_rating(self):
-        # Calcula el promedio de las calificaciones si hay alguna
-        if self.ratings:
-            # Opción más robusta usando SQLAlchemy func.avg
-            avg_score = db.session.query(func.avg(Rating.score)).filter(Rating.movie_id == self.id).scalar()
-            return round(avg_score, 1) if avg_score is not None else None
+        # Calcula el promedio a partir de los agregados, sin consultar la tabla ratings
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
         return None # Retorna None si no hay calificaciones
 
+    @staticmethod
+    def bump_version(movie_id):
+        # Incrementa la versión con un UPDATE atómico; retorna las filas afectadas (0 si no existe)
+        return db.session.query(Movie).filter(Movie.id == movie_id).update(
+            {Movie.version: Movie.version + 1}, synchronize_session=False)
+
+    @staticmethod
+    def recalculate_rating_aggregates():
+        # Recalcula rating_count y rating_sum de todas las películas desde la tabla ratings con un
+        # solo UPDATE con subconsultas correlacionadas (una ida y vuelta, atómico por fila)
+        movies, ratings = Movie.__table__, Rating.__table__
+        db.session.execute(movies.update().values(
+            rating_count=db.select(func.count(ratings.c.id)).where(ratings.c.movie_id == movies.c.id).scalar_subquery(),
+            rating_sum=db.select(func.coalesce(func.sum(ratings.c.score), 0))
+                .where(ratings.c.movie_id == movies.c.id).scalar_subquery(),
+            version=movies.c.version + 1))
+        db.session.commit()
+        return db.session.query(func.count(func.distinct(Rating.movie_id))).scalar()
+
     @property
     def genres_list(self):
         # Retorna una lista de nombres de géneros para usar fácilmente en plantillas
@@ -62,11 +121,65 @@ class Movie(db.Model):
     def __repr__(self):
         return f'<Movie {self.title}>'
 
+# Configuración de búsqueda de texto completo de PostgreSQL (la mayoría del catálogo está en español)
+SEARCH_TEXT_CONFIG = text("'spanish'::regconfig")
+
+def movie_search_vector():
+    # tsvector ponderado: el título pesa más que la descripción. La expresión debe ser idéntica
+    # en el índice GIN y en las consultas para que PostgreSQL pueda usar el índice.
+    return func.setweight(func.to_tsvector(SEARCH_TEXT_CONFIG, Movie.title), text("'A'")).op('||')(
+        func.setweight(func.to_tsvector(SEARCH_TEXT_CONFIG, Movie.description), text("'B'")))
+
+# Índice GIN de expresión (solo en PostgreSQL); se mantiene solo con cada INSERT/UPDATE
+db.Index('ix_movies_search_vector', movie_search_vector(), postgresql_using='gin').ddl_if(dialect='postgresql')
+
+# En SQLite la búsqueda usa una tabla FTS5 de contenido externo (lee título y descripción de movies)
+# que los triggers mantienen al día en cada INSERT/UPDATE/DELETE, así que todos los procesos comparten
+# el mismo índice. El tokenizador quita los acentos, como tokenize() en app/search.py.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(title, description, content='movies', "
+    "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE OF title, description ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+]
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Movie.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
 class Genre(db.Model):
     __tablename__ = 'genres' # Nombre de la tabla en la base de datos
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
 
+    @staticmethod
+    def resolve_ids(names):
+        # Retorna {nombre: id} creando los géneros que falten, con un solo SELECT y un solo INSERT
+        names = set(names)
+        if not names:
+            return {}
+        ids = dict(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(names)))
+        missing = names - ids.keys()
+        if missing:
+            db.session.execute(dialect_insert(Genre.__table__).on_conflict_do_nothing(index_elements=['name']),
+                               [{'name': name} for name in missing])
+            ids.update(db.session.query(Genre.name, Genre.id).filter(Genre.name.in_(missing)))
+        return ids
+
+    @staticmethod
+    def movie_filter(names, match_all=True):
+        # Condición SQL sobre Movie.id para filtrar por géneros (ruta SQL, usa el índice de movie_genre)
+        names = set(names)
+        movie_ids = db.session.query(movie_genre.c.movie_id) \
+            .join(Genre, Genre.id == movie_genre.c.genre_id).filter(Genre.name.in_(names))
+        if match_all:
+            movie_ids = movie_ids.group_by(movie_genre.c.movie_id) \
+                .having(func.count(movie_genre.c.genre_id) == len(names))
+        return Movie.id.in_(movie_ids)
+
     def __repr__(self):
         return f'<Genre {self.name}>'
 
@@ -74,14 +187,21 @@ class Rating(db.Model):
     __tablename__ = 'ratings' # Nombre de la tabla en la base de datos
     id = db.Column(db.Integer, primary_key=True)
     score = db.Column(db.Integer, nullable=False) # Puntuación de la calificación
+    # Puntuación anterior, escrita por el upsert en la misma sentencia: permite calcular la diferencia
+    # para los agregados de Movie sin un SELECT previo (NULL si la calificación es nueva)
+    previous_score = db.Column(db.Integer, nullable=True)
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp(), nullable=False)
 
     # Claves foráneas: Relaciona la calificación con un usuario y una película
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
 
-    # Asegura que un usuario solo pueda calificar una película una vez
-    __table_args__ = (db.UniqueConstraint('user_id', 'movie_id', name='_user_movie_uc'),)
+    # Asegura que un usuario solo pueda calificar una película una vez. El índice por película cubre
+    # el conteo y la suma de puntajes por película (recalc-ratings) sin leer la tabla.
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'movie_id', name='_user_movie_uc'),
+        db.Index('ix_ratings_movie_id_score', 'movie_id', 'score'),
+    )
 
     def __repr__(self):
         return f'<Rating {self.score}>'
@@ -96,5 +216,50 @@ class Comment(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
 
+    # Índice para listar los comentarios de una película por páginas (más recientes primero)
+    __table_args__ = (db.Index('ix_comments_movie_id_id', 'movie_id', 'id'),)
+
     def __repr__(self):
         return f'<Comment {self.content[:20]}...>' # Muestra los primeros 20 caracteres del comentario
+
+class SimilarMovie(db.Model):
+    # Tabla precalculada "a quienes les gustó esta película también les gustó":
+    # las K películas más parecidas a cada título, ordenadas por rank (0 = la más parecida)
+    __tablename__ = 'similar_movies'
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False) # Similitud coseno ajustada
+
+    similar_movie = db.relationship('Movie', foreign_keys=[similar_movie_id])
+
+    @staticmethod
+    def for_movie(movie_id, limit):
+        # Panel "títulos similares": una consulta de a lo sumo `limit` filas, sin hidratar objetos
+        return db.session.query(Movie.id, Movie.title, Movie.poster_url, SimilarMovie.score) \
+            .join(SimilarMovie, SimilarMovie.similar_movie_id == Movie.id) \
+            .filter(SimilarMovie.movie_id == movie_id) \
+            .order_by(SimilarMovie.rank).limit(limit).all()
+
+    def __repr__(self):
+        return f'<SimilarMovie {self.movie_id} -> {self.similar_movie_id}>'
+
+class JobRun(db.Model):
+    # Última ejecución de cada tarea de mantenimiento (para refrescos incrementales)
+    __tablename__ = 'job_runs'
+    name = db.Column(db.String(50), primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<JobRun {self.name}>'
+
+class LeaderboardState(db.Model):
+    # Parámetros vigentes de los rankings desde la última reconciliación (una sola fila)
+    __tablename__ = 'leaderboard_state'
+    id = db.Column(db.Integer, primary_key=True)
+    global_mean = db.Column(db.Float, nullable=False) # Media global usada en el promedio bayesiano
+    epoch = db.Column(db.DateTime, nullable=False) # Referencia temporal de trending_score
+
+    def __repr__(self):
+        return f'<LeaderboardState {self.global_mean:.2f} {self.epoch}>'
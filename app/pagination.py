@@ -0,0 +1,91 @@
+import base64
+import json
+import math
+from collections import namedtuple
+
+from sqlalchemy import and_, or_
+
+# Resultado de una página con cursores opacos para "siguiente" y "anterior"
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+def encode_cursor(values):
+    # Codifica los valores de la clave de ordenamiento como un token seguro para URLs
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    # Decodifica un cursor; retorna None si el token es inválido o fue manipulado
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+# Rango de enteros que aceptan los motores (INTEGER/BIGINT con signo de 64 bits)
+MIN_INT, MAX_INT = -2 ** 63, 2 ** 63 - 1
+
+def _valid_value(column, value):
+    # El valor de un cursor debe ser del tipo de su columna: cualquier otro (objetos, listas, texto
+    # en una columna numérica, enteros fuera de rango) haría fallar la consulta con un 500
+    if value is None:
+        return column.nullable
+    try:
+        expected = column.type.python_type
+    except NotImplementedError:
+        return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is int:
+        return isinstance(value, int) and MIN_INT <= value <= MAX_INT
+    if expected is float:
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, expected)
+
+def valid_cursor(order, values):
+    # True si el cursor decodificado corresponde a `order`: un valor del tipo de cada columna
+    return values is not None and len(values) == len(order) and \
+        all(_valid_value(column, value) for (column, _), value in zip(order, values))
+
+def _keyset_filter(order, values, forward):
+    # Construye (a > x) OR (a = x AND b > y) ... respetando la dirección de cada columna
+    clauses = []
+    for i, (column, descending) in enumerate(order):
+        after = (column < values[i]) if descending == forward else (column > values[i])
+        equals = [order[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equals, after))
+    return or_(*clauses)
+
+def _order_by(order, forward):
+    return [(column.desc() if descending == forward else column.asc()) for column, descending in order]
+
+def keyset_page(query, order, limit, after=None, before=None):
+    # Pagina `query` por keyset: `order` es una lista de (columna, descendente) que termina en una
+    # columna única (el id) y `after`/`before` son cursores decodificados de la página vecina.
+    # Nunca usa OFFSET, así que el costo no crece con la profundidad de la página.
+    forward = before is None
+    cursor = after if forward else before
+    if valid_cursor(order, cursor): # Un cursor inválido o de otro orden se ignora (primera página)
+        query = query.filter(_keyset_filter(order, cursor, forward))
+    else:
+        cursor = None
+    rows = query.order_by(*_order_by(order, forward)).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not forward:
+        rows.reverse()
+    if not rows:
+        return Page([], None, None)
+
+    def key(row):
+        return [getattr(row, column.key) for column, _ in order]
+
+    if forward:
+        next_cursor = encode_cursor(key(rows[-1])) if has_more else None
+        prev_cursor = encode_cursor(key(rows[0])) if cursor is not None else None
+    else:
+        next_cursor = encode_cursor(key(rows[-1]))
+        prev_cursor = encode_cursor(key(rows[0])) if has_more else None
+    return Page(rows, next_cursor, prev_cursor)
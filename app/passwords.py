@@ -0,0 +1,108 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Servicio de hashing de contraseñas. El KDF (bcrypt, scrypt o pbkdf2) es costoso a propósito, así que
+# corre en un pool acotado de hilos (bcrypt y hashlib liberan el GIL): como mucho PASSWORD_HASH_WORKERS
+# hashes a la vez por proceso y PASSWORD_HASH_MAX_PENDING entre en curso y en cola. Si el pool está
+# lleno la petición se rechaza de inmediato con HashingOverloaded en lugar de acumular espera.
+
+ALGORITHMS = ('bcrypt', 'scrypt', 'pbkdf2')
+
+class HashingOverloaded(RuntimeError):
+    # El pool de hashing está lleno (o no respondió a tiempo): la ruta responde 503
+    pass
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import bcrypt
+        self.bcrypt = bcrypt # Extensión Flask-Bcrypt (BCRYPT_LOG_ROUNDS, BCRYPT_HANDLE_LONG_PASSWORDS)
+        self.algorithm = app.config.get('PASSWORD_HASH_ALGORITHM', 'bcrypt')
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f'PASSWORD_HASH_ALGORITHM desconocido: {self.algorithm}')
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        # Método de Werkzeug para scrypt/pbkdf2; también identifica el prefijo de los hashes existentes
+        self.method = {
+            'scrypt': f"scrypt:{app.config.get('PASSWORD_SCRYPT_N', 32768)}:8:1",
+            'pbkdf2': f"pbkdf2:sha256:{app.config.get('PASSWORD_PBKDF2_ITERATIONS', 600000)}",
+        }.get(self.algorithm)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING') or self.workers * 4
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+
+    def _pool(self):
+        # El pool se crea en el proceso que lo usa (los hilos no sobreviven al fork de los workers)
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingOverloaded('Pool de hashing lleno')
+        try:
+            future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # El cupo se libera cuando termina el hash, aunque la petición ya haya dejado de esperar
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self.rejected += 1
+            raise HashingOverloaded('El hashing no terminó a tiempo')
+
+    def _hash(self, password):
+        if self.algorithm == 'bcrypt':
+            return self.bcrypt.generate_password_hash(password, self.rounds).decode('utf-8')
+        return generate_password_hash(password, method=self.method)
+
+    def _verify(self, pw_hash, password):
+        # Acepta cualquier formato soportado, para poder migrar hashes antiguos al iniciar sesión
+        if pw_hash.startswith('$2'):
+            return self.bcrypt.check_password_hash(pw_hash, password)
+        return check_password_hash(pw_hash, password)
+
+    def hash(self, password):
+        password_hash = self._run(self._hash, password)
+        self.hashed += 1
+        return password_hash
+
+    def verify(self, pw_hash, password):
+        valid = self._run(self._verify, pw_hash, password)
+        self.verified += 1
+        return valid
+
+    def needs_rehash(self, pw_hash):
+        # True si el hash se generó con otro algoritmo o costo que los configurados
+        if self.algorithm == 'bcrypt':
+            parts = pw_hash.split('$')
+            return not (pw_hash.startswith('$2') and len(parts) > 2 and parts[2] == f'{self.rounds:02d}')
+        return pw_hash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        return {
+            'algorithm': self.algorithm,
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'hashed': self.hashed,
+            'verified': self.verified,
+            'rejected': self.rejected,
+        }
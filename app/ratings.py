@@ -0,0 +1,162 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import bindparam, func
+
+from app import db
+from app.models import Movie, Rating, dialect_insert
+from app.leaderboards import leaderboards
+
+# Escritura de calificaciones con un único INSERT ... ON CONFLICT (user_id, movie_id) DO UPDATE,
+# que además deja la puntuación anterior en previous_score para ajustar los agregados de Movie
+# (y los puntajes de los rankings) en un solo UPDATE.
+
+logger = logging.getLogger(__name__)
+
+def _upsert_statement():
+    ratings = Rating.__table__
+    stmt = dialect_insert(ratings)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ratings.c.user_id, ratings.c.movie_id],
+        set_={
+            'previous_score': ratings.c.score, # Valor de la fila existente, antes de actualizarla
+            'score': stmt.excluded.score,
+            'timestamp': func.current_timestamp(),
+        }
+    )
+    return stmt.returning(ratings.c.movie_id, ratings.c.score, ratings.c.previous_score)
+
+def _deltas(rows):
+    # Convierte las filas retornadas por el upsert en
+    # {movie_id: [delta de conteo, delta de suma, calificaciones escritas]}
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for movie_id, score, previous_score in rows:
+        delta = deltas[movie_id]
+        if previous_score is None:
+            delta[0] += 1
+            delta[1] += score
+        else:
+            delta[1] += score - previous_score
+        delta[2] += 1
+    return deltas
+
+def _aggregate_update():
+    # UPDATE atómico de los agregados y de los puntajes de los rankings de una película
+    movies = Movie.__table__
+    count, total, activity = bindparam('b_count'), bindparam('b_sum'), bindparam('b_activity')
+    return movies.update().where(movies.c.id == bindparam('b_movie_id')).values(
+        rating_count=movies.c.rating_count + count,
+        rating_sum=movies.c.rating_sum + total,
+        version=movies.c.version + 1, # Invalida los ETags de la API
+        **leaderboards.update_values(count, total, activity))
+
+def _aggregate_params(deltas):
+    return [{'b_movie_id': movie_id, 'b_count': count, 'b_sum': total, 'b_activity': activity}
+            for movie_id, (count, total, activity) in deltas.items()]
+
+def upsert_rating(user_id, movie_id, score):
+    # Crea o actualiza la calificación y los agregados de la película (sin hacer commit).
+    # Retorna la puntuación anterior (None si es nueva); lanza LookupError si la película no existe.
+    movie_id, score, previous_score = db.session.execute(
+        _upsert_statement(), {'user_id': user_id, 'movie_id': movie_id, 'score': score, 'previous_score': None}
+    ).one()
+    params = _aggregate_params(_deltas([(movie_id, score, previous_score)]))[0]
+    if not db.session.execute(_aggregate_update(), params).rowcount:
+        raise LookupError(movie_id)
+    return previous_score
+
+def upsert_ratings(ratings):
+    # Versión por lotes: `ratings` es {(user_id, movie_id): score}. Un solo upsert para todas las filas
+    # y un UPDATE de agregados por película afectada. Retorna los ids de películas actualizadas.
+    if not ratings:
+        return set()
+    existing_movies = {movie_id for (movie_id,) in db.session.query(Movie.id).filter(
+        Movie.id.in_({movie_id for _, movie_id in ratings}))}
+    params = [{'user_id': user_id, 'movie_id': movie_id, 'score': score, 'previous_score': None}
+              for (user_id, movie_id), score in ratings.items() if movie_id in existing_movies]
+    if not params:
+        return set()
+    rows = db.session.execute(_upsert_statement(), params).all()
+    deltas = _deltas(rows)
+    db.session.execute(_aggregate_update(), _aggregate_params(deltas))
+    return set(deltas)
+
+class RatingBuffer:
+    # Modo de ingesta con buffer (opcional, RATING_BUFFER_ENABLED): agrupa ráfagas de calificaciones
+    # en memoria y las escribe periódicamente con upsert_ratings. Si un usuario califica varias veces
+    # antes del siguiente volcado, solo se escribe la última puntuación.
+    # Las calificaciones pendientes se pierden si el proceso muere sin poder volcarlas.
+    def __init__(self, app=None):
+        self.enabled = False
+        self.interval = 2.0
+        self.max_pending = 500
+        self._app = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._on_flush = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get('RATING_BUFFER_ENABLED', False)
+        self.interval = app.config.get('RATING_BUFFER_INTERVAL', 2.0)
+        self.max_pending = app.config.get('RATING_BUFFER_MAX_PENDING', 500)
+        if self.enabled:
+            atexit.register(self.flush)
+
+    def on_flush(self, callback):
+        # Registra `callback(movie_ids)`, llamado después de cada volcado confirmado
+        self._on_flush.append(callback)
+        return callback
+
+    def add(self, user_id, movie_id, score):
+        self._ensure_thread()
+        with self._lock:
+            self._pending[(user_id, movie_id)] = score
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        # El hilo se crea en el proceso que lo usa (los hilos no sobreviven al fork de los workers)
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='rating-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return set()
+        with self._app.app_context():
+            try:
+                movie_ids = upsert_ratings(pending)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('No se pudo volcar el buffer de calificaciones; se reintentará')
+                with self._lock:
+                    # Las calificaciones más nuevas que llegaron mientras tanto tienen prioridad
+                    self._pending = {**pending, **self._pending}
+                return set()
+            finally:
+                db.session.remove()
+            for callback in self._on_flush:
+                callback(movie_ids)
+        return movie_ids
+
+rating_buffer = RatingBuffer()
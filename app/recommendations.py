@@ -0,0 +1,198 @@
+from itertools import chain
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+
+from app import db
+from app.models import Rating, SimilarMovie, JobRun
+
+# Recomendaciones ítem a ítem ("a quienes les gustó esta película también les gustó").
+# Se arma una matriz dispersa usuarios x películas con las puntuaciones centradas en la media de
+# cada película y columnas de norma 1 (coseno centrado por ítem), y las similitudes salen de
+# productos dispersos por bloques de películas. Solo se guarda el top-K de cada película en
+# similar_movies, así que el panel del detalle se sirve con una consulta de K filas.
+# Con el centrado por ítem una calificación nueva solo cambia la columna de su película: el
+# refresco incremental recalcula esas columnas y las listas que las contienen, sin tocar el resto.
+
+JOB_NAME = 'recommendations'
+
+def movie_stats(movie_ids, scores):
+    # (películas ordenadas, media, norma de las puntuaciones centradas) de cada película
+    movies, index = np.unique(movie_ids, return_inverse=True)
+    scores = np.asarray(scores, dtype=np.float64)
+    counts = np.bincount(index)
+    sums = np.bincount(index, weights=scores)
+    squares = np.bincount(index, weights=scores * scores)
+    return _stats(movies, counts, sums, squares)
+
+def _stats(movies, counts, sums, squares):
+    means = sums / counts
+    norms = np.sqrt(np.maximum(squares - counts * means * means, 0.0))
+    norms[norms < 1e-9] = 1.0 # Columnas nulas (todas las puntuaciones iguales): similitud 0
+    return movies, means, norms
+
+def rating_matrix(user_ids, movie_ids, scores, stats=None):
+    # Retorna (X, movies): X es CSC usuarios x películas con columnas centradas y de norma 1, y
+    # movies[i] es el id de la película de la columna i. `stats` son las estadísticas globales de
+    # las películas (movie_stats); por defecto salen de los mismos datos. Con estadísticas globales
+    # basta cargar las calificaciones de los usuarios relevantes para obtener similitudes exactas.
+    movies, means, norms = stats if stats is not None else movie_stats(movie_ids, scores)
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    movie_index = np.searchsorted(movies, movie_ids)
+    values = ((np.asarray(scores, dtype=np.float64) - means[movie_index]) / norms[movie_index]).astype(np.float32)
+    X = sparse.csc_matrix((values, (user_index, movie_index)), shape=(len(users), len(movies)))
+    return X, movies
+
+def similarity_block(X, columns):
+    # Similitudes (densas) de las columnas indicadas contra todas las demás; la diagonal queda en 0
+    block = (X[:, columns].T.tocsr() @ X).toarray()
+    block[np.arange(len(columns)), columns] = 0.0
+    return block
+
+def top_k(block, k):
+    # Índices y puntajes de las k similitudes positivas más altas de cada fila, ordenadas
+    k = min(k, block.shape[1])
+    if k <= 0:
+        return np.empty((block.shape[0], 0), dtype=np.int64), np.empty((block.shape[0], 0), dtype=block.dtype)
+    candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    candidate_scores = np.take_along_axis(block, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+def build_similarities(X, movies, k=20, block_size=512, only=None):
+    # Genera (movie_id, [(similar_movie_id, score), ...]) para todas las películas o solo `only`
+    columns = np.arange(len(movies)) if only is None else np.searchsorted(movies, np.asarray(sorted(only)))
+    for start in range(0, len(columns), block_size):
+        block_columns = columns[start:start + block_size]
+        indices, scores = top_k(similarity_block(X, block_columns), k)
+        for row, column in enumerate(block_columns):
+            yield int(movies[column]), [(int(movies[j]), float(score))
+                                        for j, score in zip(indices[row], scores[row]) if score > 0]
+
+def load_ratings(movie_ids=None):
+    # Lee las calificaciones como arreglos de NumPy (sin hidratar objetos del ORM). Con `movie_ids`
+    # solo las de los usuarios que calificaron alguna de esas películas: las únicas que aportan a
+    # sus similitudes.
+    query = db.session.query(Rating.user_id, Rating.movie_id, Rating.score)
+    if movie_ids is not None:
+        raters = db.session.query(Rating.user_id).filter(Rating.movie_id.in_(sorted(movie_ids)))
+        query = query.filter(Rating.user_id.in_(raters))
+    # fromiter sobre las tuplas aplanadas evita que NumPy inspeccione cada Row
+    data = np.fromiter(chain.from_iterable(query.yield_per(50000)), dtype=np.int64).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+def load_stats():
+    # Estadísticas globales de cada película con una sola agregación en la base de datos
+    rows = db.session.query(Rating.movie_id, func.count(Rating.id), func.sum(Rating.score),
+                            func.sum(Rating.score * Rating.score)).group_by(Rating.movie_id).order_by(Rating.movie_id)
+    data = np.array(rows.all(), dtype=np.float64).reshape(-1, 4)
+    return _stats(data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3])
+
+def similarity_rows(movie_ids, stats, k, block_size):
+    # Similitudes exactas de `movie_ids` contra todas las películas cargando solo las columnas
+    # necesarias; retorna ({movie_id: top-K}, {movie_id: {otra: similitud > 0}})
+    user_ids, rated_ids, scores = load_ratings(movie_ids)
+    X, movies = rating_matrix(user_ids, rated_ids, scores, stats)
+    columns = np.searchsorted(movies, np.asarray(sorted(movie_ids)))
+    tops, similarities = {}, {}
+    for start in range(0, len(columns), block_size):
+        block_columns = columns[start:start + block_size]
+        block = similarity_block(X, block_columns)
+        indices, top_scores = top_k(block, k)
+        for row, column in enumerate(block_columns):
+            movie_id = int(movies[column])
+            tops[movie_id] = [(int(movies[j]), float(score)) for j, score in zip(indices[row], top_scores[row]) if score > 0]
+            positive = np.flatnonzero(block[row] > 0)
+            similarities[movie_id] = dict(zip(movies[positive].tolist(), block[row, positive].tolist()))
+    return tops, similarities
+
+def save_similarities(results):
+    # Reemplaza las filas de las películas recibidas en similar_movies
+    results = dict(results)
+    if not results:
+        return 0
+    movie_ids = list(results)
+    for start in range(0, len(movie_ids), 500):
+        SimilarMovie.query.filter(SimilarMovie.movie_id.in_(movie_ids[start:start + 500])).delete(synchronize_session=False)
+    rows = [{'movie_id': movie_id, 'rank': rank, 'similar_movie_id': similar_id, 'score': score}
+            for movie_id, similar in results.items() for rank, (similar_id, score) in enumerate(similar)]
+    if rows:
+        db.session.execute(SimilarMovie.__table__.insert(), rows)
+    return len(results)
+
+def _record_run(started_at):
+    run = db.session.get(JobRun, JOB_NAME) or JobRun(name=JOB_NAME)
+    run.started_at = started_at
+    run.finished_at = db.session.query(db.func.current_timestamp()).scalar()
+    db.session.add(run)
+
+def rebuild(k=20, block_size=512):
+    # Recalcula la tabla completa; retorna el número de películas procesadas
+    started_at = db.session.query(db.func.current_timestamp()).scalar()
+    user_ids, movie_ids, scores = load_ratings()
+    SimilarMovie.query.delete(synchronize_session=False)
+    updated = 0
+    if len(scores):
+        X, movies = rating_matrix(user_ids, movie_ids, scores)
+        updated = save_similarities(build_similarities(X, movies, k=k, block_size=block_size))
+    _record_run(started_at)
+    db.session.commit()
+    return updated
+
+def refresh(k=20, block_size=512):
+    # Refresco incremental, equivalente a una reconstrucción completa:
+    # 1) las películas con calificaciones nuevas o modificadas desde la última ejecución (su columna
+    #    cambió) se recalculan completas;
+    # 2) en la lista de cada otra película solo cambian los puntajes de esas películas: se combinan
+    #    con su lista guardada. Si una de ellas bajó y la lista llena quedaría con un hueco que la
+    #    lista guardada no sabe rellenar, esa película también se recalcula completa.
+    last_run = db.session.get(JobRun, JOB_NAME)
+    if last_run is None:
+        return rebuild(k=k, block_size=block_size)
+    started_at = db.session.query(db.func.current_timestamp()).scalar()
+    dirty = {movie_id for (movie_id,) in db.session.query(Rating.movie_id).filter(
+        Rating.timestamp >= last_run.started_at).distinct()}
+    if not dirty:
+        _record_run(started_at)
+        db.session.commit()
+        return 0
+
+    stats = load_stats()
+    updates, similarities = similarity_rows(dirty, stats, k, block_size)
+
+    # Películas cuya lista puede cambiar: las que tienen a una modificada en su lista actual
+    # o las que tienen similitud positiva con alguna modificada
+    affected = {other_id for scores in similarities.values() for other_id in scores}
+    for start in range(0, len(dirty), 500):
+        chunk = sorted(dirty)[start:start + 500]
+        affected.update(movie_id for (movie_id,) in db.session.query(SimilarMovie.movie_id).filter(
+            SimilarMovie.similar_movie_id.in_(chunk)).distinct())
+    affected -= dirty
+    current = {movie_id: [] for movie_id in affected}
+    affected_ids = sorted(affected)
+    for start in range(0, len(affected_ids), 500):
+        for movie_id, similar_id, score in db.session.query(
+                SimilarMovie.movie_id, SimilarMovie.similar_movie_id, SimilarMovie.score).filter(
+                SimilarMovie.movie_id.in_(affected_ids[start:start + 500])).order_by(SimilarMovie.movie_id, SimilarMovie.rank):
+            current[movie_id].append((similar_id, score))
+
+    recompute = set()
+    for other_id in affected_ids:
+        base = current[other_id]
+        merged = [(similar_id, score) for similar_id, score in base if similar_id not in dirty]
+        merged += [(movie_id, scores[other_id]) for movie_id, scores in similarities.items() if other_id in scores]
+        merged.sort(key=lambda item: (-item[1], item[0]))
+        merged = merged[:k]
+        # Con la lista llena, las candidatas que no están en ella puntúan como mucho su último valor
+        if len(base) >= k and (len(merged) < k or merged[-1][1] < base[-1][1]):
+            recompute.add(other_id)
+        elif merged != base:
+            updates[other_id] = merged
+    if recompute:
+        updates.update(similarity_rows(recompute, stats, k, block_size)[0])
+
+    updated = save_similarities(updates)
+    _record_run(started_at)
+    db.session.commit()
+    return updated
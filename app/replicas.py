@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+import time
+
+from flask import request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+logger = logging.getLogger(__name__)
+
+# Enrutamiento de lecturas a réplicas. Las peticiones GET/HEAD eligen una réplica sana (round-robin)
+# y todas sus consultas de solo lectura van allí. Las escrituras, las peticiones POST y las de un
+# usuario que escribió hace menos de READ_YOUR_WRITES_SECONDS van al primario.
+# La salud de las réplicas la revisa un hilo de fondo por proceso: las peticiones nunca esperan
+# un chequeo, y una réplica no recibe lecturas hasta que su primer chequeo sale bien.
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_UNTIL_KEY = '_primary_until' # Clave en la sesión firmada: hasta cuándo leer del primario
+
+class RoutingSession(Session):
+    # Sesión de db: usa la réplica asignada a la petición salvo para escrituras
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and (self._flushing or getattr(clause, 'is_dml', False)):
+            # Escritura: se registra y el resto de la petición lee del primario (lee lo que escribió)
+            self.info['wrote'] = True
+            self.info.pop('replica', None)
+        elif bind is None and self.info.get('replica') is not None:
+            return self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+class Replica:
+    def __init__(self, key, engine):
+        self.key = key
+        self.engine = engine
+        self.healthy = False # Hasta el primer chequeo del hilo de fondo se lee del primario
+        self.checked_at = 0.0
+        self.failures = 0
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.replicas = []
+        self._next = 0
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+        self.window = app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        self.interval = app.config.get('REPLICA_HEALTH_CHECK_INTERVAL', 10)
+        keys = sorted(key for key in (app.config.get('SQLALCHEMY_BINDS') or {}) if key.startswith('replica_'))
+        with app.app_context():
+            self.replicas = [Replica(key, db.engines[key]) for key in keys]
+        for replica in self.replicas:
+            # Un error de conexión marca la réplica como caída hasta el próximo chequeo
+            event.listen(replica.engine, 'handle_error', self._on_error(replica))
+        if self.replicas:
+            app.before_request(self._route_request)
+            app.after_request(self._remember_writes)
+
+    def _on_error(self, replica):
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self._set_health(replica, False)
+        return handle_error
+
+    def _set_health(self, replica, healthy):
+        with self._lock:
+            # El primer chequeo exitoso no es una recuperación (las réplicas arrancan sin usarse)
+            if replica.healthy != healthy and (replica.checked_at or not healthy):
+                logger.warning('Réplica %s %s', replica.key, 'recuperada' if healthy else 'fuera de servicio')
+            replica.healthy = healthy
+            replica.checked_at = time.monotonic()
+            replica.failures = 0 if healthy else replica.failures + 1
+
+    def check(self, replica):
+        # Chequeo de salud: una consulta trivial con una conexión del pool de la réplica
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception:
+            self._set_health(replica, False)
+        else:
+            self._set_health(replica, True)
+        return replica.healthy
+
+    def check_all(self):
+        for replica in self.replicas:
+            self.check(replica)
+
+    def _monitor(self):
+        while True:
+            self.check_all()
+            time.sleep(self.interval)
+
+    def _ensure_monitor(self):
+        # El hilo se crea en el proceso que lo usa (los hilos no sobreviven al fork de los workers)
+        if self._monitor_pid == os.getpid():
+            return
+        with self._lock:
+            if self._monitor_pid != os.getpid():
+                self._monitor_pid = os.getpid()
+                threading.Thread(target=self._monitor, name='replica-health', daemon=True).start()
+
+    def choose(self):
+        # Siguiente réplica sana en round-robin según el último chequeo (sin I/O en la petición).
+        # Retorna None si no hay ninguna sana (se lee del primario).
+        self._ensure_monitor()
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            replica = healthy[self._next % len(healthy)]
+            self._next += 1
+        return replica
+
+    def _route_request(self):
+        from app import db
+        if request.method not in SAFE_METHODS:
+            return
+        if session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            return # Ventana de read-your-writes: el usuario escribió hace poco
+        replica = self.choose()
+        if replica is not None:
+            db.session.info['replica'] = replica.engine
+
+    def _remember_writes(self, response):
+        from app import db
+        if db.session.registry.has() and db.session.info.get('wrote') and response.status_code < 400:
+            session[PRIMARY_UNTIL_KEY] = time.time() + self.window
+        return response
+
+    def status(self):
+        return [{'key': replica.key, 'healthy': replica.healthy, 'failures': replica.failures}
+                for replica in self.replicas]
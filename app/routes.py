@@ -1,49 +1,141 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, abort, make_response
+from markupsafe import Markup
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps # Para crear decoradores personalizados
-from sqlalchemy.orm import joinedload # Para cargar relaciones de forma eficiente
+from sqlalchemy.orm import joinedload, selectinload # Para cargar relaciones de forma eficiente
 from sqlalchemy.exc import IntegrityError # Para manejar errores de unicidad
+from sqlalchemy import func # Para conteos agregados
 import datetime
 
-from app import db, login_manager # Importa db y login_manager de app/__init__.py
-from app.models import User, Movie, Genre, Rating, Comment # Importa todos los modelos
+from app import db, fragment_cache, search_index, genre_index, identity_cache, sql_instrumentation, replica_router, password_hasher # Importa db y las extensiones de app/__init__.py
+from app.models import User, Movie, Genre, Rating, Comment, SimilarMovie # Importa los modelos
 from app.forms import RegistrationForm, LoginForm, MovieForm, RatingForm, CommentForm, CommentForm
+from app.pagination import keyset_page, decode_cursor, encode_cursor, valid_cursor # Paginación por keyset
+from app.ratings import upsert_rating, rating_buffer # Escritura de calificaciones (upsert y buffer)
+from app.leaderboards import leaderboards # Rankings de mejor calificadas y tendencias
+from app.passwords import HashingOverloaded # Pool de hashing de contraseñas lleno
 
 # Crea un Blueprint llamado 'main'
 main = Blueprint('main', __name__)
 
-# Función para cargar un usuario para Flask-Login (requerido)
-@login_manager.user_loader
-def load_user(user_id):
-    # La importación de User se mueve aquí para evitar importaciones circulares.
-    return User.query.get(int(user_id))
-
 # Decorador personalizado para requerir rol de moderador
 def moderator_required(f):
     @wraps(f)
     @login_required # Primero asegura que el usuario esté logueado
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or current_user.role != 'moderator':
+        # El rol se relee del primario: la identidad cacheada (o el claim de sesión) puede venir de un
+        # worker que no vio el cambio de rol, y los privilegios no pueden esperar a que expire
+        role = db.session.execute(db.select(User.role).where(User.id == current_user.id),
+                                  bind_arguments={'bind': db.engine}).scalar() if current_user.is_authenticated else None
+        if current_user.is_authenticated and role != current_user.role:
+            identity_cache.invalidate(current_user.id) # Este worker también deja de servir el rol viejo
+        if role != 'moderator':
             flash('No tienes permiso para acceder a esta página.', 'danger')
             return redirect(url_for('main.home')) # Redirige a home si no es moderador
         return f(*args, **kwargs)
     return decorated_function
 
+# Opciones de ordenamiento del catálogo: (columna, descendente), siempre terminando en el id
+HOME_SORT_OPTIONS = {
+    'recent': [(Movie.release_year, True), (Movie.id, True)],
+    'title': [(Movie.title, False), (Movie.id, False)],
+}
+
+# Parámetros del catálogo compartidos por la página de inicio y la API JSON
+def catalog_params(genre_name=None):
+    sort = request.args.get('sort', 'recent')
+    if sort not in HOME_SORT_OPTIONS:
+        sort = 'recent'
+    per_page = request.args.get('per_page', current_app.config['MOVIES_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['MOVIES_PER_PAGE_MAX']))
+    # Filtro por géneros: todos (AND) o alguno (OR) de los seleccionados
+    selected_genres = list(dict.fromkeys(([genre_name] if genre_name else []) + [g for g in request.args.getlist('genre') if g]))
+    match = 'any' if request.args.get('match') == 'any' else 'all'
+    return sort, per_page, selected_genres, match
+
+def filter_by_genres(query, selected_genres, match):
+    # El índice de géneros resuelve el filtro con operaciones de bits; si el resultado es pequeño
+    # se pasa como lista IN, y si es grande el filtro se hace en SQL con el índice de movie_genre.
+    # Retorna la consulta filtrada y el bitset de películas que coinciden (None sin filtro)
+    if not selected_genres:
+        return query, None
+    matching = genre_index.match(selected_genres, match_all=(match == 'all'))
+    if genre_index.count(matching) <= current_app.config['GENRE_FILTER_IN_LIST_MAX']:
+        return query.filter(Movie.id.in_(genre_index.ids(matching))), matching
+    return query.filter(Genre.movie_filter(selected_genres, match_all=(match == 'all'))), matching
+
 # Ruta de la página de inicio
 @main.route('/')
 @main.route('/home')
-def home():
-    # Obtener todas las películas de la base de datos
-    # Usamos joinedload para precargar las relaciones genres_rel y ratings para evitar consultas N+1
-    movies = Movie.query.options(joinedload(Movie.genres_rel), joinedload(Movie.ratings)).all()
+@main.route('/genre/<genre_name>')
+def home(genre_name=None):
+    # Catálogo paginado por keyset (sin OFFSET) para que el costo no crezca con el tamaño del catálogo
+    sort, per_page, selected_genres, match = catalog_params(genre_name)
+
+    # selectinload trae los géneros de la página en una sola consulta; nunca se cargan calificaciones
+    query, matching = filter_by_genres(Movie.query.options(selectinload(Movie.genres_rel)), selected_genres, match)
+    page = keyset_page(query, HOME_SORT_OPTIONS[sort], per_page,
+                       after=decode_cursor(request.args.get('after')),
+                       before=decode_cursor(request.args.get('before')))
+
+    # Cada tarjeta se sirve desde la caché de fragmentos; solo se renderizan las que faltan
+    cards = [fragment_cache.get_or_render(movie.id, 'card',
+                                          lambda movie=movie: Markup(render_template('_movie_card.html', movie_data=movie)),
+                                          version=movie.version)
+             for movie in page.items]
+
+    # Conteos por género (dentro del filtro actual) desde el índice precalculado, sin GROUP BY
+    facets = genre_index.facet_counts(within=matching)
+
+    # Solo se considera el catálogo vacío si la primera página no trae resultados y no hay filtros
+    is_empty = not page.items and not selected_genres and not request.args.get('after') and not request.args.get('before')
+    return render_template('home.html', title='Inicio', cards=cards, is_empty=is_empty,
+                           page=page, sort=sort, per_page=per_page,
+                           sort_options=list(HOME_SORT_OPTIONS),
+                           facets=facets, selected_genres=selected_genres, match=match)
+
 
-    # Si no hay películas en la DB, mostrar un mensaje apropiado
-    if not movies:
-        return render_template('home.html', title='Inicio', movies=[], is_empty=True)
+# Rankings materializados: el top N sale de un índice, sin importar el tamaño del catálogo
+def render_leaderboard(title, description, movies):
+    cards = [fragment_cache.get_or_render(movie.id, 'card',
+                                          lambda movie=movie: Markup(render_template('_movie_card.html', movie_data=movie)),
+                                          version=movie.version)
+             for movie in movies]
+    return render_template('leaderboard.html', title=title, description=description, cards=cards)
 
-    return render_template('home.html', title='Inicio', movies=movies, is_empty=False)
+def leaderboard_limit():
+    size = current_app.config['LEADERBOARD_SIZE']
+    return max(1, min(request.args.get('n', size, type=int), size))
 
+@main.route('/top-rated')
+def top_rated():
+    return render_leaderboard('Mejor calificadas', 'Promedio bayesiano: las películas con pocas calificaciones se acercan a la media general.',
+                              leaderboards.top_rated(leaderboard_limit()))
+
+@main.route('/trending')
+def trending():
+    return render_leaderboard('Tendencias', 'Las películas con más calificaciones recientes.',
+                              leaderboards.trending(leaderboard_limit()))
+
+# Ruta de búsqueda de películas por título y descripción, ordenadas por relevancia
+@main.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    results = search_index.search(query, limit=current_app.config['MOVIES_PER_PAGE'])
+    ids = [movie_id for movie_id, _ in results]
+    movies = {movie.id: movie for movie in Movie.query.options(selectinload(Movie.genres_rel)).filter(Movie.id.in_(ids))} if ids else {}
+    cards = [fragment_cache.get_or_render(movie_id, 'card',
+                                          lambda movie=movies[movie_id]: Markup(render_template('_movie_card.html', movie_data=movie)),
+                                          version=movies[movie_id].version)
+             for movie_id in ids if movie_id in movies]
+    return render_template('search.html', title='Buscar', query=query, cards=cards)
+
+def hashing_busy(template, **context):
+    # Respuesta rápida cuando el pool de hashing está saturado (en vez de encolar más trabajo)
+    flash('El servidor está ocupado en este momento. Intenta de nuevo en unos segundos.', 'danger')
+    response = make_response(render_template(template, **context), 503)
+    response.headers['Retry-After'] = '1'
+    return response
 
 # Ruta de registro de usuario
 @main.route('/register', methods=['GET', 'POST'])
@@ -53,8 +145,11 @@ def register():
 
     form = RegistrationForm()
     if form.validate_on_submit(): # Si el formulario es enviado y es válido
-        # Quita .decode('utf-8') porque generate_password_hash ya devuelve un string
-        hashed_password = generate_password_hash(form.password.data) 
+        # El hash se calcula en el pool acotado de password_hasher (algoritmo y costo según la configuración)
+        try:
+            hashed_password = password_hasher.hash(form.password.data)
+        except HashingOverloaded:
+            return hashing_busy('register.html', title='Registro', form=form)
         # Por defecto, todos los usuarios registrados son 'standard'
         user = User(username=form.username.data, email=form.email.data, password_hash=hashed_password, role='standard')
         try:
@@ -76,8 +171,20 @@ def login():
     form = LoginForm()
     if form.validate_on_submit(): # Si el formulario es enviado y es válido
         user = User.query.filter_by(email=form.email.data).first()
-        if user and check_password_hash(user.password_hash, form.password.data):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, form.password.data)
+        except HashingOverloaded:
+            return hashing_busy('login.html', title='Iniciar Sesión', form=form)
+        if valid:
+            if password_hasher.needs_rehash(user.password_hash):
+                # Rehash transparente si cambió el algoritmo o el costo (solo aquí se tiene la contraseña)
+                try:
+                    user.password_hash = password_hasher.hash(form.password.data)
+                    db.session.commit()
+                except HashingOverloaded:
+                    pass # Se reintenta en el próximo inicio de sesión
             login_user(user) # Inicia la sesión del usuario
+            identity_cache.remember(user)
             flash(f'¡Bienvenido de nuevo, {user.username}! Has iniciado sesión. 🎉', 'success')
             # Si el usuario intentó acceder a una página protegida antes de loguearse, redirigirlo allí
             next_page = request.args.get('next')
@@ -91,6 +198,7 @@ def login():
 @login_required # Requiere que el usuario esté logueado para cerrar sesión
 def logout():
     logout_user() # Cierra la sesión del usuario
+    identity_cache.forget()
     flash('Has cerrado tu sesión.', 'info')
     return redirect(url_for('main.home')) # Redirige a home
 
@@ -108,20 +216,20 @@ def add_movie():
             trailer_url=form.trailer_url.data
         )
         
-        # Procesar los géneros
-        genres_input = [g.strip() for g in form.genres.data.split(',')]
+        # Procesar los géneros: una sola consulta para todos los nombres (sin vacíos ni repetidos)
+        genres_input = list(dict.fromkeys(g.strip() for g in form.genres.data.split(',') if g.strip()))
+        existing_genres = {genre.name: genre for genre in Genre.query.filter(Genre.name.in_(genres_input))}
         for genre_name in genres_input:
-            if genre_name: # Asegurarse de que el nombre del género no esté vacío
-                genre = Genre.query.filter_by(name=genre_name).first()
-                if not genre:
-                    # Si el género no existe, créalo
-                    genre = Genre(name=genre_name)
-                    db.session.add(genre)
-                new_movie.genres_rel.append(genre) # Añadir el género a la película
+            # Si el género no existe, créalo
+            genre = existing_genres.get(genre_name) or Genre(name=genre_name)
+            new_movie.genres_rel.append(genre) # Añadir el género a la película
         
         try:
             db.session.add(new_movie)
             db.session.commit()
+            fragment_cache.invalidate_movie(new_movie.id)
+            search_index.index_movie(new_movie) # Actualiza el índice de búsqueda de forma incremental
+            genre_index.add_movie(new_movie.id, new_movie.genres_list) # Y el índice de géneros
             flash(f'Película "{new_movie.title}" añadida exitosamente.', 'success')
             return redirect(url_for('main.movie_detail', movie_id=new_movie.id)) # Redirige a la página de detalle
         except IntegrityError:
@@ -130,16 +238,49 @@ def add_movie():
             
     return render_template('add_movie.html', title='Añadir Película', form=form)
 
+# Página de comentarios más recientes primero, paginada por keyset sobre el id
+COMMENTS_ORDER = [(Comment.id, True)]
+
+def comments_page(movie_id, after=None):
+    query = Comment.query.options(joinedload(Comment.author)).filter(Comment.movie_id == movie_id)
+    return keyset_page(query, COMMENTS_ORDER, current_app.config['COMMENTS_PER_PAGE'], after=after)
+
+def movie_version_or_404(movie_id):
+    # Versión actual de la película (la incrementan las escrituras de calificaciones y comentarios)
+    version = db.session.query(Movie.version).filter(Movie.id == movie_id).scalar()
+    if version is None:
+        abort(404)
+    return version
+
+def render_comments_page(movie_id, after=None):
+    comments = comments_page(movie_id, after=after)
+    return Markup(render_template('_comment_page.html', movie_id=movie_id, comments=comments))
+
 # Ruta para ver el detalle de una película, calificar y comentar
 @main.route('/movie/<int:movie_id>')
 def movie_detail(movie_id):
-    # Carga la película y sus relaciones ratings y comments y authors para acceso eficiente en la plantilla
-    movie = Movie.query.options(
-        joinedload(Movie.ratings).joinedload(Rating.author),
-        joinedload(Movie.comments).joinedload(Comment.author),
-        joinedload(Movie.genres_rel)
-    ).get_or_404(movie_id)
+    # La cabecera y la primera página de comentarios salen de la caché de fragmentos. Si faltan,
+    # se resuelven con un número fijo de consultas sin importar la popularidad de la película:
+    # película + géneros, conteo de comentarios y la primera página de comentarios.
+    # Los agregados de calificación salen de las columnas de Movie, nunca se cargan las calificaciones.
+    # Las claves llevan la versión de la película leída del mismo bind que renderiza (ver FragmentCache).
+    version = movie_version_or_404(movie_id)
+    header = fragment_cache.get(movie_id, 'header', version)
+    if header is None:
+        movie = Movie.query.options(selectinload(Movie.genres_rel)).get_or_404(movie_id)
+        header = {'title': movie.title, 'html': Markup(render_template('_movie_header.html', movie=movie))}
+        fragment_cache.set(movie_id, 'header', header, version=version)
+
+    def render_first_comments():
+        count = db.session.query(func.count(Comment.id)).filter(Comment.movie_id == movie_id).scalar()
+        return {'count': count, 'html': render_comments_page(movie_id)}
+    comments = fragment_cache.get_or_render(movie_id, 'comments', render_first_comments, version=version)
+
+    # Panel "títulos similares" desde la tabla precalculada (a lo sumo K filas)
+    similar = fragment_cache.get_or_render(movie_id, 'similar', lambda: Markup(render_template(
+        '_similar_movies.html', similar=SimilarMovie.for_movie(movie_id, current_app.config['SIMILAR_MOVIES_SHOWN']))))
     
+    # El formulario de calificación depende del usuario, así que nunca se cachea
     rating_form = RatingForm()
     comment_form = CommentForm()
 
@@ -147,7 +288,7 @@ def movie_detail(movie_id):
     existing_rating = None
     if current_user.is_authenticated:
         # Verifica si el usuario actual ya ha calificado esta película
-        existing_rating = Rating.query.filter_by(user_id=current_user.id, movie_id=movie.id).first()
+        existing_rating = Rating.query.filter_by(user_id=current_user.id, movie_id=movie_id).first()
         if existing_rating:
             user_has_rated = True
             # Pre-rellena el formulario de calificación con la puntuación existente
@@ -155,43 +296,90 @@ def movie_detail(movie_id):
 
 
     return render_template('movie_detail.html',
-                           title=movie.title,
-                           movie=movie,
+                           title=header['title'],
+                           header=header,
+                           similar=similar,
+                           movie_id=movie_id,
+                           comments=comments,
                            rating_form=rating_form,
                            comment_form=comment_form,
                            user_has_rated=user_has_rated,
                            existing_rating=existing_rating)
 
+# Ruta "cargar más": retorna solo el fragmento HTML con la siguiente página de comentarios
+@main.route('/movie/<int:movie_id>/comments')
+def movie_comments(movie_id):
+    # Un cursor inválido es un error (400): servir la primera página haría que "cargar más" la
+    # agregara otra vez debajo de la actual. La clave de caché usa el cursor decodificado y
+    # recodificado, así que los tokens equivalentes comparten entrada y la basura no crea ninguna.
+    token = request.args.get('after')
+    after = decode_cursor(token)
+    if token and not valid_cursor(COMMENTS_ORDER, after):
+        abort(400)
+    key = f'comments:{encode_cursor(after)}' if after else 'comments:'
+    return fragment_cache.get_or_render(movie_id, key, lambda: render_comments_page(movie_id, after=after),
+                                        version=movie_version_or_404(movie_id))
+
+# Estadísticas de la caché de fragmentos (aciertos, fallos y desalojos) para dimensionarla
+@main.route('/cache/stats')
+@moderator_required
+def cache_stats():
+    return jsonify(fragment_cache.stats())
+
+# Estado de las réplicas de lectura (sanas o fuera de servicio)
+@main.route('/debug/replicas')
+@moderator_required
+def replicas_status():
+    return jsonify(replica_router.status())
+
+# Estadísticas SQL por ruta (solo con SQL_INSTRUMENTATION activado); ?reset=1 reinicia los contadores
+@main.route('/debug/sql-stats')
+@moderator_required
+def sql_stats():
+    if not sql_instrumentation.enabled:
+        abort(404)
+    stats = sql_instrumentation.stats()
+    if request.args.get('reset'):
+        sql_instrumentation.reset()
+    return jsonify(stats)
+
+# Se llama después de confirmar calificaciones (en la petición o al volcar el buffer)
+@rating_buffer.on_flush
+def ratings_changed(movie_ids):
+    for movie_id in movie_ids:
+        fragment_cache.invalidate_movie(movie_id) # El promedio cambió: invalida tarjeta y cabecera
+
 # Ruta para calificar una película
 @main.route('/movie/<int:movie_id>/rate', methods=['POST'])
 @login_required # Solo usuarios logueados pueden calificar
 def rate_movie(movie_id):
-    movie = Movie.query.get_or_404(movie_id)
     form = RatingForm()
     if form.validate_on_submit():
-        # Verifica si el usuario ya ha calificado esta película
-        existing_rating = Rating.query.filter_by(user_id=current_user.id, movie_id=movie.id).first()
-        if existing_rating:
-            # Actualiza la calificación existente
-            existing_rating.score = form.score.data
-            flash('Tu calificación ha sido actualizada.', 'success')
-        else:
-            # Crea una nueva calificación
-            new_rating = Rating(score=form.score.data, user_id=current_user.id, movie_id=movie.id)
-            db.session.add(new_rating)
-            flash('¡Gracias por tu calificación!', 'success')
-        
+        if rating_buffer.enabled:
+            # Modo con buffer: la calificación se escribe en el próximo volcado por lotes
+            rating_buffer.add(current_user.id, movie_id, form.score.data)
+            flash('¡Gracias por tu calificación! Se verá reflejada en unos segundos.', 'success')
+            return redirect(url_for('main.movie_detail', movie_id=movie_id))
+
+        # Un solo INSERT ... ON CONFLICT DO UPDATE crea o actualiza la calificación,
+        # y un UPDATE atómico ajusta los agregados de la película
         try:
+            previous_score = upsert_rating(current_user.id, movie_id, form.score.data)
             db.session.commit()
-        except IntegrityError: # Poco probable si el UniqueConstraint funciona, pero buena práctica
+        except (LookupError, IntegrityError): # La película no existe
             db.session.rollback()
-            flash('Ya calificaste esta película.', 'danger')
+            abort(404)
+        ratings_changed([movie_id])
+        if previous_score is not None:
+            flash('Tu calificación ha sido actualizada.', 'success')
+        else:
+            flash('¡Gracias por tu calificación!', 'success')
             
     else: # Si el formulario no es válido
         for field, errors in form.errors.items():
             for error in errors:
                 flash(f'Error en {form[field].label.text}: {error}', 'danger')
-    return redirect(url_for('main.movie_detail', movie_id=movie.id))
+    return redirect(url_for('main.movie_detail', movie_id=movie_id))
 
 # Ruta para añadir un comentario a una película
 @main.route('/movie/<int:movie_id>/comment', methods=['POST'])
@@ -202,9 +390,11 @@ def add_comment(movie_id):
     if form.validate_on_submit():
         new_comment = Comment(content=form.content.data, user_id=current_user.id, movie_id=movie.id)
         db.session.add(new_comment)
+        Movie.bump_version(movie.id) # Invalida los ETags de la API para esta película
         
         try:
             db.session.commit()
+            fragment_cache.invalidate_movie(movie.id) # Invalida las páginas de comentarios cacheadas
             flash('Tu comentario ha sido publicado exitosamente.', 'success')
         except IntegrityError:
             db.session.rollback()
@@ -0,0 +1,245 @@
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+from sqlalchemy import desc, text
+
+# Búsqueda de texto completo sobre título y descripción de las películas.
+# En PostgreSQL usa el índice GIN de tsvector y en SQLite la tabla FTS5 (ambos definidos en models.py
+# y mantenidos por la base de datos); en cualquier otro motor, un índice invertido en memoria con BM25.
+# En todos los backends una película coincide solo si contiene todos los términos (AND), como
+# plainto_tsquery en PostgreSQL.
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Palabras vacías frecuentes en español e inglés que no aportan al ranking
+STOPWORDS = frozenset('''
+a al con de del el en es la las lo los o para por que se su un una y
+an and are for in is it of on or the to with
+'''.split())
+
+TITLE_WEIGHT = 3 # Un término en el título cuenta como tres en la descripción
+
+def tokenize(text):
+    # Normaliza (minúsculas y sin acentos) y separa en términos
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+class InvertedIndex:
+    # Índice invertido en memoria: término -> {movie_id: frecuencia ponderada}
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_terms = {} # movie_id -> términos, para poder reindexar una película
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, movie_id, title, description):
+        frequencies = defaultdict(int)
+        for token in tokenize(title or ''):
+            frequencies[token] += TITLE_WEIGHT
+        for token in tokenize(description or ''):
+            frequencies[token] += 1
+        with self._lock:
+            self.remove(movie_id)
+            for term, frequency in frequencies.items():
+                self.postings[term][movie_id] = frequency
+            length = sum(frequencies.values())
+            self.doc_terms[movie_id] = tuple(frequencies)
+            self.doc_lengths[movie_id] = length
+            self.total_length += length
+
+    def remove(self, movie_id):
+        with self._lock:
+            for term in self.doc_terms.pop(movie_id, ()):
+                postings = self.postings.get(term)
+                if postings is not None:
+                    postings.pop(movie_id, None)
+                    if not postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(movie_id, 0)
+
+    def search(self, query, limit=20):
+        # Retorna [(movie_id, puntaje)] ordenado por relevancia (BM25) entre las películas que
+        # contienen todos los términos de la consulta
+        terms = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self.doc_lengths)
+            if not terms or not total_docs:
+                return []
+            postings_by_term = [self.postings.get(term) for term in terms]
+            if not all(postings_by_term):
+                return []
+            # Intersección empezando por la lista más corta: solo se puntúan las candidatas
+            postings_by_term.sort(key=len)
+            candidates = set(postings_by_term[0])
+            for postings in postings_by_term[1:]:
+                candidates.intersection_update(postings)
+                if not candidates:
+                    return []
+            average_length = self.total_length / total_docs
+            scores = dict.fromkeys(candidates, 0.0)
+            for postings in postings_by_term:
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for movie_id in candidates:
+                    frequency = postings[movie_id]
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[movie_id] / average_length)
+                    scores[movie_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+class MemorySearchBackend:
+    # Índice en memoria del proceso: se construye de forma perezosa en la primera búsqueda, se
+    # actualiza de forma incremental cuando add_movie hace commit y se reconstruye cuando supera
+    # SEARCH_INDEX_MAX_AGE segundos, para que cada worker vea las películas añadidas en otro proceso.
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.index = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def _ensure_built(self):
+        if self._expired():
+            with self._lock:
+                if self._expired():
+                    self.rebuild()
+        return self.index
+
+    def _expired(self):
+        return self._built_at is None or (self.max_age and time.monotonic() - self._built_at > self.max_age)
+
+    def _build(self):
+        from app import db
+        from app.models import Movie
+        index = InvertedIndex()
+        rows = db.session.query(Movie.id, Movie.title, Movie.description).yield_per(1000)
+        for movie_id, title, description in rows:
+            index.add(movie_id, title, description)
+        return index
+
+    def ensure_schema(self):
+        return False
+
+    def rebuild(self):
+        index = self._build()
+        self.index = index
+        self._built_at = time.monotonic()
+        return len(index)
+
+    def index_movie(self, movie):
+        # Si el índice aún no existe, se construirá completo (incluyendo esta película) en la primera búsqueda
+        if self.index is not None:
+            self.index.add(movie.id, movie.title, movie.description)
+
+    def search(self, query, limit):
+        return self._ensure_built().search(query, limit)
+
+class SqliteSearchBackend:
+    # Tabla FTS5 en la misma base de datos: los triggers la mantienen al día y bm25() ordena por
+    # relevancia con el título pesando TITLE_WEIGHT veces la descripción
+    def ensure_schema(self):
+        # Crea la tabla y los triggers en bases creadas antes de la búsqueda FTS5 (flask init-db);
+        # retorna True si tuvo que crearlos, y entonces ya quedó poblada
+        from app import db
+        if db.inspect(db.engine).has_table('movies_fts'):
+            return False
+        self.rebuild()
+        return True
+
+    def rebuild(self):
+        from app import db
+        from app.models import Movie, SQLITE_SEARCH_DDL
+        with db.engine.begin() as connection:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')")
+        return db.session.query(Movie.id).count()
+
+    def index_movie(self, movie):
+        pass
+
+    def search(self, query, limit):
+        from app import db
+        # Los mismos términos que el índice en memoria (sin palabras vacías), separados por espacios
+        # (AND implícito en FTS5); entre comillas para que FTS5 no interprete operadores.
+        # tokenize() ya dejó solo caracteres \w.
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        rows = db.session.execute(text(
+            'SELECT rowid, bm25(movies_fts, :title_weight, 1.0) AS rank FROM movies_fts '
+            'WHERE movies_fts MATCH :match ORDER BY rank, rowid LIMIT :limit'),
+            {'title_weight': TITLE_WEIGHT, 'match': ' '.join(f'"{term}"' for term in terms), 'limit': limit})
+        return [(movie_id, -float(rank)) for movie_id, rank in rows] # bm25() es menor cuanto más relevante
+
+class PostgresSearchBackend:
+    # Usa el índice GIN de expresión: PostgreSQL lo mantiene al día en cada INSERT/UPDATE
+    def ensure_schema(self):
+        return False # El índice está en los modelos: lo crea create_missing_indexes()
+
+    def rebuild(self):
+        from app import db
+        from app.models import Movie
+        index = next(i for i in Movie.__table__.indexes if i.name == 'ix_movies_search_vector')
+        index.create(db.engine, checkfirst=True)
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('REINDEX INDEX ix_movies_search_vector')
+        return db.session.query(Movie.id).count()
+
+    def index_movie(self, movie):
+        pass
+
+    def search(self, query, limit):
+        from app import db
+        from app.models import Movie, movie_search_vector, SEARCH_TEXT_CONFIG
+        ts_query = db.func.plainto_tsquery(SEARCH_TEXT_CONFIG, query)
+        rank = db.func.ts_rank(movie_search_vector(), ts_query).label('rank')
+        rows = db.session.query(Movie.id, rank).filter(movie_search_vector().op('@@')(ts_query)) \
+            .order_by(desc('rank'), Movie.id).limit(limit).all()
+        return [(movie_id, float(score)) for movie_id, score in rows]
+
+class MovieSearch:
+    # Extensión de búsqueda (se crea vacía y se vincula con init_app, como las demás)
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('SEARCH_BACKEND', 'auto')
+        if backend == 'auto':
+            uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+            backend = 'postgres' if uri.startswith('postgres') else 'sqlite' if uri.startswith('sqlite') else 'memory'
+        if backend == 'postgres':
+            self.backend = PostgresSearchBackend()
+        elif backend == 'sqlite':
+            self.backend = SqliteSearchBackend()
+        elif backend == 'memory':
+            self.backend = MemorySearchBackend(max_age=app.config.get('SEARCH_INDEX_MAX_AGE', 300))
+        else:
+            raise ValueError(f'SEARCH_BACKEND desconocido: {backend}')
+
+    def search(self, query, limit=20):
+        # API de consulta: retorna [(movie_id, puntaje)] ordenado por relevancia
+        query = (query or '').strip()
+        if not query:
+            return []
+        return self.backend.search(query, limit)
+
+    def index_movie(self, movie):
+        self.backend.index_movie(movie)
+
+    def ensure_schema(self):
+        return self.backend.ensure_schema()
+
+    def rebuild(self):
+        return self.backend.rebuild()
@@ -0,0 +1,142 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app import db, search_index, genre_index, password_hasher
+from app.models import User, Movie, Genre, Rating, Comment, movie_genre
+
+# Generador de datos sintéticos reproducibles para desarrollo y benchmarks.
+# La popularidad de películas y géneros y la actividad de usuarios siguen una distribución Zipf:
+# pocas películas concentran la mayoría de calificaciones y comentarios, como en un catálogo real.
+
+SEED_PASSWORD = 'popcorn123' # Contraseña de todos los usuarios generados (para probar el login)
+SEED_EMAIL_DOMAIN = 'seed.example.com' # Dominio reservado para ejemplos (el validador de email rechaza .test)
+
+GENRE_NAMES = ['Drama', 'Comedia', 'Acción', 'Aventura', 'Terror', 'Ciencia ficción', 'Romance',
+               'Animación', 'Documental', 'Suspenso', 'Fantasía', 'Crimen', 'Misterio', 'Musical',
+               'Familiar', 'Bélica', 'Western', 'Historia', 'Biografía', 'Deporte']
+
+WORDS = ['noche', 'ciudad', 'espacio', 'amor', 'guerra', 'secreto', 'viaje', 'sombra', 'fuego', 'mar',
+         'último', 'perdido', 'rojo', 'silencio', 'tiempo', 'reino', 'camino', 'estrella', 'sueño', 'hermano',
+         'familia', 'venganza', 'robot', 'isla', 'montaña', 'verano', 'invierno', 'ladrón', 'detective', 'rey',
+         'planeta', 'memoria', 'frontera', 'río', 'bosque', 'leyenda', 'misión', 'destino', 'corazón', 'tormenta']
+
+def zipf_weights(n, exponent):
+    # Probabilidades proporcionales a 1 / rango^exponent
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+def synthetic_ratings(n_ratings, n_users, n_movies, seed=42):
+    # Retorna (usuarios 0..n_users-1, películas 1..n_movies, puntajes 1..5) sin pares repetidos
+    if not n_ratings or not n_users or not n_movies:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    rng = np.random.default_rng(seed)
+    draws = int(n_ratings * 1.5)
+    users = rng.choice(n_users, size=draws, p=zipf_weights(n_users, 0.8))
+    movies = rng.choice(n_movies, size=draws, p=zipf_weights(n_movies, 1.1))
+    # Un usuario califica cada película una sola vez: se descartan pares repetidos
+    pairs = np.unique(users.astype(np.int64) * n_movies + movies)
+    pairs = rng.permutation(pairs)[:n_ratings]
+    users, movies = pairs // n_movies, pairs % n_movies
+    scores = rng.integers(1, 6, size=len(pairs))
+    return users, movies + 1, scores
+
+def _sentence(rng, n_words):
+    return ' '.join(rng.choice(WORDS, size=n_words))
+
+def _insert(table, rows, batch_size, returning=None):
+    # INSERT masivo por lotes; con `returning` retorna los ids generados en orden
+    ids = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        if returning is not None:
+            ids.extend(db.session.execute(
+                db.insert(table).returning(returning, sort_by_parameter_order=True), batch).scalars())
+        else:
+            db.session.execute(db.insert(table), batch)
+    return ids
+
+def _timestamps(rng, size, days, now):
+    # Marcas de tiempo uniformes en los últimos `days` días (UTC sin zona, como current_timestamp)
+    offsets = rng.uniform(0, days * 86400, size=size)
+    return [now - timedelta(seconds=float(offset)) for offset in offsets]
+
+def seed_database(users=1000, movies=2000, genres=12, ratings=50000, comments=5000,
+                  days=60, seed=42, batch_size=1000, progress=None):
+    # Inserta los datos en la base configurada y reconstruye agregados, rankings e índices.
+    # Con la misma semilla y los mismos tamaños genera siempre los mismos datos.
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    report = progress or (lambda step: None)
+    if not users or not movies:
+        ratings = comments = 0 # Sin usuarios o sin películas no hay a quién atribuir actividad
+
+    # Usuarios: un solo hash compartido (hashear miles de contraseñas dominaría el tiempo de carga)
+    password_hash = password_hasher.hash(SEED_PASSWORD) # Con el algoritmo y costo configurados
+    offset = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    user_ids = _insert(User.__table__, [
+        {'username': f'user{offset + i}', 'email': f'user{offset + i}@{SEED_EMAIL_DOMAIN}',
+         'password_hash': password_hash, 'role': 'standard'}
+        for i in range(users)
+    ], batch_size, returning=User.id)
+    report('usuarios')
+
+    names = GENRE_NAMES[:genres] + [f'Género {i}' for i in range(len(GENRE_NAMES) + 1, genres + 1)]
+    genre_ids = Genre.resolve_ids(names)
+    genre_weights = zipf_weights(len(names), 1.0)
+    report('géneros')
+
+    offset = (db.session.query(db.func.max(Movie.id)).scalar() or 0) + 1
+    years = rng.integers(1950, now.year + 1, size=movies)
+    movie_ids = _insert(Movie.__table__, [
+        {'title': f'{_sentence(rng, 2).capitalize()} {offset + i}', 'description': _sentence(rng, int(rng.integers(15, 40))),
+         'release_year': int(years[i]), 'poster_url': f'https://picsum.photos/seed/{offset + i}/300/450',
+         'trailer_url': None}
+        for i in range(movies)
+    ], batch_size, returning=Movie.id)
+    if names: # Con --genres 0 las películas quedan sin géneros
+        _insert(movie_genre, [
+            {'movie_id': movie_id, 'genre_id': genre_ids[name]}
+            for movie_id in movie_ids
+            for name in rng.choice(names, size=int(rng.integers(1, min(3, len(names)) + 1)), replace=False, p=genre_weights)
+        ], batch_size)
+    report('películas')
+
+    rating_users, rating_movies, scores = synthetic_ratings(ratings, users, movies, seed=seed)
+    _insert(Rating.__table__, [
+        {'user_id': user_ids[u], 'movie_id': movie_ids[m - 1], 'score': int(s), 'timestamp': t}
+        for u, m, s, t in zip(rating_users, rating_movies, scores, _timestamps(rng, len(scores), days, now))
+    ], batch_size)
+    report('calificaciones')
+
+    if comments: # Las distribuciones de Zipf no existen con 0 usuarios o 0 películas
+        comment_users = rng.choice(users, size=comments, p=zipf_weights(users, 0.8))
+        comment_movies = rng.choice(movies, size=comments, p=zipf_weights(movies, 1.1))
+        _insert(Comment.__table__, [
+            {'user_id': user_ids[u], 'movie_id': movie_ids[m], 'content': _sentence(rng, int(rng.integers(5, 30))), 'timestamp': t}
+            for u, m, t in zip(comment_users, comment_movies, sorted(_timestamps(rng, comments, days, now)))
+        ], batch_size)
+    db.session.commit()
+    report('comentarios')
+
+    # Los INSERT masivos no pasan por las rutas: se reconstruye todo lo derivado
+    from app.leaderboards import leaderboards
+    Movie.recalculate_rating_aggregates()
+    leaderboards.reconcile()
+    genre_index.rebuild()
+    search_index.rebuild()
+    report('índices')
+
+    return {
+        'users': len(user_ids),
+        'movies': len(movie_ids),
+        'genres': len(names),
+        'ratings': int(len(scores)),
+        'comments': comments,
+        'seconds': round(time.perf_counter() - started, 3),
+        'user_ids': (user_ids[0], user_ids[-1]) if user_ids else None,
+        'movie_ids': (movie_ids[0], movie_ids[-1]) if movie_ids else None,
+    }
@@ -0,0 +1,92 @@
+# Benchmark del arranque de un worker: importación, create_app y primera petición en un proceso nuevo,
+# comparado con el costo de revisar el esquema (lo que create_app hacía antes con db.create_all())
+# y con el arranque por fork desde un maestro que ya precargó la app (gunicorn --preload).
+# Uso: python benchmarks/bench_boot.py [--runs 10] [--database-url sqlite:///boot.db] [--output resultados.json]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un intérprete nuevo en cada corrida (arranque en frío real, sin módulos en caché)
+CHILD = r'''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from app import create_app, db
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+with app.app_context():
+    db.create_all() # Solo para medir la revisión del esquema que antes hacía cada worker
+schema = time.perf_counter()
+app.test_client().get('/')
+first_request = time.perf_counter()
+
+# Arranque por fork: el maestro ya tiene la app; el hijo solo atiende su primera petición
+fork_ms = None
+if hasattr(os, 'fork'):
+    read_end, write_end = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        app.test_client().get('/')
+        os.write(write_end, str((time.perf_counter() - forked) * 1000).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    fork_ms = float(os.read(read_end, 64).decode())
+
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'schema_check_ms': (schema - created) * 1000,
+    'first_request_ms': (first_request - schema) * 1000,
+    'cold_boot_ms': (first_request - started) * 1000 - (schema - created) * 1000,
+    'fork_boot_ms': fork_ms,
+}))
+'''
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    p50, p95 = np.percentile(values, [50, 95])
+    return {'p50': round(float(p50), 2), 'p95': round(float(p95), 2), 'min': round(float(min(values)), 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de workers")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto un SQLite temporal)')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'boot.db')
+    # El esquema se crea una vez, como en un despliegue (flask init-db)
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'run.py', 'init-db'], cwd=ROOT, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', CHILD, ROOT], cwd=ROOT, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    results = {
+        'runs': args.runs,
+        'database': env['DATABASE_URL'].split(':', 1)[0],
+        **{key: summarize([run[key] for run in runs]) for key in runs[0]},
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
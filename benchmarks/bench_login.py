@@ -0,0 +1,119 @@
+# Benchmark de throughput de login según el número de hilos del pool de hashing (uno por núcleo).
+# Varios clientes concurrentes hacen POST /login durante un tiempo fijo por configuración; se reportan
+# logins por segundo, latencia p50/p95 y rechazos rápidos (503) cuando el pool está saturado.
+# Uso: python benchmarks/bench_login.py [--workers 1,2,4] [--clients-per-worker 2] [--duration 5] [--output resultados.json]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config # noqa: E402
+from app import create_app, db, password_hasher # noqa: E402
+from app.models import User # noqa: E402
+from app.seed import seed_database, SEED_PASSWORD, SEED_EMAIL_DOMAIN # noqa: E402
+
+def available_cores():
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+def run_clients(app, emails, clients, duration):
+    # Cada cliente hace logins con un cliente de pruebas nuevo (sin sesión) hasta que se acaba el tiempo
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(index):
+        local_latencies, local_statuses = [], []
+        i = index
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = app.test_client().post('/login', data={'email': emails[i % len(emails)], 'password': SEED_PASSWORD})
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            local_statuses.append(response.status_code)
+            if response.status_code == 503:
+                # Como un cliente real, espera lo que indica Retry-After antes de reintentar
+                time.sleep(min(float(response.headers.get('Retry-After', 1)), max(0.0, deadline - time.perf_counter())))
+            i += clients
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.extend(local_statuses)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+def main():
+    cores = available_cores()
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de login")
+    parser.add_argument('--workers', default=','.join(str(2 ** i) for i in range(cores.bit_length()) if 2 ** i <= cores),
+                        help='Hilos del pool de hashing a probar, separados por coma (por defecto potencias de 2 hasta los núcleos)')
+    parser.add_argument('--clients-per-worker', type=int, default=2, help='Clientes concurrentes por hilo del pool')
+    parser.add_argument('--max-pending', type=int, default=None, help='Cupo del pool (por defecto 4 x hilos)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Segundos por configuración')
+    parser.add_argument('--algorithm', default='bcrypt', choices=['bcrypt', 'scrypt', 'pbkdf2'])
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'login.db')
+
+    def make_app(workers):
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = database_url
+            WTF_CSRF_ENABLED = False
+            PASSWORD_HASH_ALGORITHM = args.algorithm
+            BCRYPT_LOG_ROUNDS = args.rounds
+            PASSWORD_HASH_WORKERS = workers
+            PASSWORD_HASH_MAX_PENDING = args.max_pending
+        return create_app(BenchConfig)
+
+    app = make_app(1)
+    with app.app_context():
+        db.create_all()
+        seed_database(users=args.users, movies=1, genres=1, ratings=0, comments=0)
+        emails = [email for (email,) in db.session.query(User.email).filter(User.email.like(f'%@{SEED_EMAIL_DOMAIN}'))]
+
+    results = {'cores': cores, 'algorithm': args.algorithm, 'rounds': args.rounds, 'duration': args.duration, 'runs': []}
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(',')]:
+        app = make_app(workers)
+        clients = workers * args.clients_per_worker
+        latencies, statuses, elapsed = run_clients(app, emails, clients, args.duration)
+        ok = [latency for latency, status in zip(latencies, statuses) if status == 302]
+        rejected = sum(1 for status in statuses if status == 503)
+        throughput = len(ok) / elapsed
+        baseline = baseline or throughput
+        p50, p95 = np.percentile(ok, [50, 95]) if ok else (None, None)
+        results['runs'].append({
+            'workers': workers,
+            'clients': clients,
+            'max_pending': password_hasher.max_pending,
+            'logins': len(ok),
+            'logins_per_second': round(throughput, 2),
+            'speedup': round(throughput / baseline, 2) if baseline else None,
+            'p50_ms': round(float(p50), 2) if ok else None,
+            'p95_ms': round(float(p95), 2) if ok else None,
+            'rejected_503': rejected,
+            'failed': len(statuses) - len(ok) - rejected,
+        })
+        print(f'{workers} hilos: {throughput:.1f} logins/s', file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
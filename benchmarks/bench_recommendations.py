@@ -0,0 +1,54 @@
+# Benchmark de la construcción de recomendaciones ítem a ítem con calificaciones sintéticas.
+# Uso: python benchmarks/bench_recommendations.py [--ratings 1000000] [--movies 20000] [--users 100000]
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.recommendations import rating_matrix, build_similarities # noqa: E402
+from app.seed import synthetic_ratings # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de construcción de recomendaciones")
+    parser.add_argument('--ratings', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--movies', type=int, default=20_000)
+    parser.add_argument('--top-k', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=512)
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    users, movies, scores = synthetic_ratings(args.ratings, args.users, args.movies)
+    tracemalloc.start()
+    started = time.perf_counter()
+    X, movie_ids = rating_matrix(users, movies, scores)
+    matrix_seconds = time.perf_counter() - started
+    rows = 0
+    for _, similar in build_similarities(X, movie_ids, k=args.top_k, block_size=args.block_size):
+        rows += len(similar)
+    total_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results = {
+        'ratings': int(len(scores)),
+        'users': int(X.shape[0]),
+        'movies': int(X.shape[1]),
+        'top_k': args.top_k,
+        'block_size': args.block_size,
+        'matrix_seconds': round(matrix_seconds, 3),
+        'build_seconds': round(total_seconds, 3),
+        'similarity_rows': rows,
+        'peak_memory_mb': round(peak / 2 ** 20, 1),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
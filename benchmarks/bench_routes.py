@@ -0,0 +1,168 @@
+# Benchmark de las rutas principales con el cliente de pruebas de Flask sobre datos sintéticos.
+# Reporta latencia p50/p95/p99, consultas SQL por petición y memoria pico de cada ruta en JSON,
+# para comparar resultados entre commits.
+# Uso: python benchmarks/bench_routes.py [--database-url sqlite:///bench.db] [--movies 2000] [--output resultados.json]
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config # noqa: E402
+from app import create_app, db # noqa: E402
+from app.models import User, Movie, Genre # noqa: E402
+from app.seed import seed_database, zipf_weights, SEED_PASSWORD, SEED_EMAIL_DOMAIN # noqa: E402
+
+def build_routes(rng, movie_ids, genre_names, user_emails):
+    # Cada ruta: (nombre, método, generador de (ruta, datos), cliente, códigos esperados).
+    # Clientes: 'anonymous', 'member' (con sesión iniciada) o 'fresh' (uno nuevo por petición, sin cookies)
+    # Las películas se eligen con la misma popularidad Zipf de los datos (las populares se piden más)
+    popularity = zipf_weights(len(movie_ids), 1.1)
+
+    def movie():
+        return int(movie_ids[rng.choice(len(movie_ids), p=popularity)])
+
+    return [
+        ('home', 'GET', lambda: ('/', None), 'anonymous', {200}),
+        ('home_genre', 'GET', lambda: (f'/?genre={rng.choice(genre_names)}', None), 'anonymous', {200}),
+        ('movie_detail', 'GET', lambda: (f'/movie/{movie()}', None), 'anonymous', {200}),
+        ('search', 'GET', lambda: ('/search?q=noche+ciudad', None), 'anonymous', {200}),
+        ('top_rated', 'GET', lambda: ('/top-rated', None), 'anonymous', {200}),
+        ('api_movies', 'GET', lambda: ('/api/movies', None), 'anonymous', {200}),
+        ('rate_movie', 'POST', lambda: (f'/movie/{movie()}/rate', {'score': int(rng.integers(1, 6))}), 'member', {302}),
+        ('login', 'POST', lambda: ('/login', {'email': str(rng.choice(user_emails)), 'password': SEED_PASSWORD}), 'fresh', {302}),
+    ]
+
+class QueryCounter:
+    # Cuenta las sentencias SQL ejecutadas por el engine
+    def __init__(self, engine):
+        self.count = 0
+        db.event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+def run_route(get_client, counter, method, make_request, expected, requests, warmup, memory_requests):
+    def send():
+        path, data = make_request()
+        response = get_client().open(path, method=method, data=data)
+        if response.status_code not in expected:
+            raise RuntimeError(f'{method} {path} respondió {response.status_code}')
+        response.close()
+
+    for _ in range(warmup):
+        send()
+
+    latencies, queries = [], []
+    for _ in range(requests):
+        before = counter.count
+        started = time.perf_counter()
+        send()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+
+    # La memoria se mide en una pasada aparte: tracemalloc distorsiona la latencia
+    tracemalloc.start()
+    for _ in range(memory_requests):
+        send()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': requests,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(np.mean(latencies)), 3),
+        'queries_per_request': round(float(np.mean(queries)), 2),
+        'max_queries': int(max(queries)),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de rutas con datos sintéticos")
+    parser.add_argument('--database-url', help='Base de datos a usar (por defecto un SQLite temporal)')
+    parser.add_argument('--no-seed', action='store_true', help='Usa los datos existentes (p. ej. de `flask seed-data`)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--genres', type=int, default=12)
+    parser.add_argument('--ratings', type=int, default=50000)
+    parser.add_argument('--comments', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='Peticiones medidas por ruta')
+    parser.add_argument('--warmup', type=int, default=20, help='Peticiones de calentamiento por ruta')
+    parser.add_argument('--memory-requests', type=int, default=20, help='Peticiones de la pasada de memoria')
+    parser.add_argument('--cache-type', default='lru', choices=['lru', 'filesystem', 'null'])
+    parser.add_argument('--routes', help='Rutas a medir separadas por coma (por defecto todas)')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        WTF_CSRF_ENABLED = False
+        CACHE_TYPE = args.cache_type
+        RATING_BUFFER_ENABLED = False
+
+    app = create_app(BenchConfig)
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'cache_type': args.cache_type,
+        'seed': args.seed,
+    }
+    with app.app_context():
+        results['database'] = db.engine.dialect.name
+        if not args.no_seed:
+            db.create_all()
+            results['seeding'] = seed_database(users=args.users, movies=args.movies, genres=args.genres,
+                                               ratings=args.ratings, comments=args.comments, seed=args.seed)
+        movie_ids = [movie_id for (movie_id,) in db.session.query(Movie.id).order_by(Movie.rating_count.desc(), Movie.id)]
+        genre_names = [name for (name,) in db.session.query(Genre.name)]
+        user_emails = [email for (email,) in db.session.query(User.email).filter(User.email.like(f'%@{SEED_EMAIL_DOMAIN}'))]
+        counter = QueryCounter(db.engine)
+    if not movie_ids or not user_emails:
+        parser.error('La base no tiene datos generados con `flask seed-data`.')
+
+    rng = np.random.default_rng(args.seed)
+    selected = set(args.routes.split(',')) if args.routes else None
+    anonymous, member = app.test_client(), app.test_client()
+    response = member.post('/login', data={'email': user_emails[0], 'password': SEED_PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError('No se pudo iniciar sesión con un usuario generado.')
+
+    results['routes'] = {}
+    # El login necesita un cliente sin sesión en cada petición (con sesión activa solo redirige)
+    clients = {'anonymous': lambda: anonymous, 'member': lambda: member, 'fresh': app.test_client}
+    for name, method, make_request, client, expected in build_routes(rng, movie_ids, genre_names, user_emails):
+        if selected and name not in selected:
+            continue
+        results['routes'][name] = run_route(clients[client], counter, method, make_request, expected,
+                                            args.requests, args.warmup, args.memory_requests)
+        print(f"{name}: p50 {results['routes'][name]['p50_ms']} ms", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
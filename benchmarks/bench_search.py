@@ -0,0 +1,86 @@
+# Benchmark de la búsqueda de texto completo con un catálogo sintético: tiempo de reconstrucción,
+# latencia de la primera búsqueda de un worker nuevo (con el backend en memoria incluye construir el
+# índice) y latencia p50/p95 para cada backend disponible en SQLite. Hay dos tipos de consulta: 'common',
+# de 1 a 3 palabras del vocabulario sintético (40 palabras: cada una aparece en cerca de la mitad del
+# catálogo, el peor caso para rankear), y 'selective', el número único de un título (como buscar una
+# película concreta).
+# Uso: python benchmarks/bench_search.py [--movies 100000] [--queries 500] [--backends sqlite,memory] [--output resultados.json]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config # noqa: E402
+from app import create_app, db, search_index # noqa: E402
+from app.seed import seed_database, WORDS # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de texto completo")
+    parser.add_argument('--movies', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=24, help='Resultados por búsqueda (MOVIES_PER_PAGE)')
+    parser.add_argument('--backends', default='sqlite,memory', help='Backends a comparar, separados por coma')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db')
+
+    def make_app(backend):
+        class BenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = database_url
+            SEARCH_BACKEND = backend
+        return create_app(BenchConfig)
+
+    app = make_app('sqlite')
+    with app.app_context():
+        db.create_all()
+        seed_database(users=1, movies=args.movies, ratings=0, comments=0, seed=args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    queries = {
+        'common': [' '.join(rng.choice(WORDS, size=int(rng.integers(1, 4)))) for _ in range(args.queries)],
+        'selective': [str(n) for n in rng.integers(1, args.movies + 1, size=args.queries)],
+    }
+
+    results = {'movies': args.movies, 'queries': args.queries, 'limit': args.limit, 'backends': []}
+    for backend in args.backends.split(','):
+        # Cada backend arranca como un worker nuevo: nada construido en memoria
+        app = make_app(backend)
+        with app.app_context():
+            started = time.perf_counter()
+            search_index.search(queries['common'][0], limit=args.limit)
+            first_query_ms = (time.perf_counter() - started) * 1000
+
+            run = {'backend': backend, 'first_query_ms': round(first_query_ms, 2)}
+            for kind, kind_queries in queries.items():
+                latencies, hits = [], 0
+                for query in kind_queries:
+                    started = time.perf_counter()
+                    hits += len(search_index.search(query, limit=args.limit))
+                    latencies.append((time.perf_counter() - started) * 1000)
+                p50, p95 = np.percentile(latencies, [50, 95])
+                run[kind] = {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+                             'mean_results': round(hits / len(kind_queries), 1)}
+
+            started = time.perf_counter()
+            search_index.rebuild()
+            run['rebuild_seconds'] = round(time.perf_counter() - started, 3)
+        results['backends'].append(run)
+        print(f"{backend}: p50 {run['common']['p50_ms']:.2f} / {run['selective']['p50_ms']:.2f} ms, "
+              f'primera búsqueda {first_query_ms:.0f} ms', file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
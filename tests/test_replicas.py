@@ -0,0 +1,116 @@
+# Enrutamiento a réplicas de lectura con dos archivos SQLite: el primario y una copia que hace de réplica
+# (la "replicación" se simula copiando filas a mano), más una réplica caída que nunca debe recibir lecturas.
+# Uso: python -m pytest tests/test_replicas.py
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config # noqa: E402
+from app import create_app, db, replica_router # noqa: E402
+from app.models import User, Movie # noqa: E402
+
+PASSWORD = 'secret1'
+
+@pytest.fixture
+def databases(tmp_path):
+    primary, replica = str(tmp_path / 'primary.db'), str(tmp_path / 'replica.db')
+
+    class PrimaryConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+
+    app = create_app(PrimaryConfig)
+    with app.app_context():
+        db.create_all(bind_key=None) # Solo el primario (db recuerda los binds de réplica de otras apps)
+        db.session.add(User(username='u1', email='u1@example.com', password_hash=generate_password_hash(PASSWORD)))
+        for i in range(1, 3):
+            db.session.add(Movie(title=f'Peli {i}', description='Una historia', release_year=2000, poster_url='http://p'))
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copy(primary, replica)
+    # La réplica tiene un título distinto para saber de dónde se leyó cada página
+    execute(replica, "UPDATE movies SET title = 'Peli 2 (réplica)' WHERE id = 2")
+    return primary, replica
+
+@pytest.fixture
+def app(databases, tmp_path):
+    primary, replica = databases
+
+    class ReplicaConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + primary
+        DATABASE_REPLICA_URLS = ['sqlite:///' + replica, 'sqlite:///' + str(tmp_path / 'missing' / 'down.db')]
+        READ_YOUR_WRITES_SECONDS = 0.5
+        REPLICA_HEALTH_CHECK_INTERVAL = 3600 # Los chequeos se hacen a mano en las pruebas
+        WTF_CSRF_ENABLED = False
+        TESTING = True
+
+    app = create_app(ReplicaConfig)
+    replica_router.check_all()
+    return app
+
+def execute(path, sql, *params):
+    connection = sqlite3.connect(path)
+    with connection:
+        rows = connection.execute(sql, params).fetchall()
+    connection.close()
+    return rows
+
+def login(client):
+    response = client.post('/login', data={'email': 'u1@example.com', 'password': PASSWORD})
+    assert response.status_code == 302
+
+def test_get_reads_from_healthy_replica_only(app):
+    assert [(r['key'], r['healthy']) for r in replica_router.status()] == [('replica_0', True), ('replica_1', False)]
+    client = app.test_client()
+    for _ in range(4):
+        response = client.get('/movie/2')
+        assert response.status_code == 200
+        assert 'Peli 2 (réplica)' in response.get_data(as_text=True)
+
+def test_requests_never_probe_replicas(app, monkeypatch):
+    probes = []
+    check = replica_router.check
+    monkeypatch.setattr(replica_router, 'check', lambda replica: probes.append(threading.current_thread()) or check(replica))
+    for replica in replica_router.replicas:
+        replica.checked_at = 0.0 # Chequeos vencidos: antes se hacían dentro de la petición
+    assert app.test_client().get('/movie/2').status_code == 200
+    assert threading.current_thread() not in probes
+
+def test_writes_go_to_primary_and_pin_reads(app, databases):
+    primary, replica = databases
+    client = app.test_client()
+    login(client)
+    assert client.post('/movie/2/comment', data={'content': 'escrito en el primario'}).status_code == 302
+    count = "SELECT count(*) FROM comments WHERE content = 'escrito en el primario'"
+    assert execute(primary, count) == [(1,)]
+    assert execute(replica, count) == [(0,)]
+
+    # Read-your-writes: durante la ventana el autor lee del primario
+    body = client.get('/movie/2').get_data(as_text=True)
+    assert 'escrito en el primario' in body and 'Peli 2 (réplica)' not in body
+    time.sleep(0.6)
+    assert 'Peli 2 (réplica)' in client.get('/movie/2').get_data(as_text=True)
+
+def test_fragment_from_lagging_replica_is_replaced_when_it_catches_up(app, databases):
+    primary, replica = databases
+    reader, writer = app.test_client(), app.test_client()
+    assert '(Sin calificaciones)' in reader.get('/movie/1').get_data(as_text=True)
+
+    login(writer)
+    assert writer.post('/movie/1/rate', data={'score': 4}).status_code == 302
+    # La réplica todavía no recibe la calificación: el lector ve (y se cachea) la versión vieja
+    assert '(Sin calificaciones)' in reader.get('/movie/1').get_data(as_text=True)
+
+    # Replicación: la réplica se pone al día y la siguiente lectura ya no sirve el fragmento viejo
+    (row,) = execute(primary, 'SELECT rating_count, rating_sum, version FROM movies WHERE id = 1')
+    execute(replica, 'UPDATE movies SET rating_count = ?, rating_sum = ?, version = ? WHERE id = 1', *row)
+    assert '(1 calificaciones)' in reader.get('/movie/1').get_data(as_text=True)